@@ -0,0 +1,36 @@
+"""add unlogged import_staging table for parallel imports
+
+Revision ID: base003
+Revises: base002
+Create Date: 2025-01-03 00:00:00
+"""
+from alembic import op
+
+revision = "base003"
+down_revision = "base002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE UNLOGGED TABLE IF NOT EXISTS import_staging ("
+        " id BIGSERIAL PRIMARY KEY,"
+        " job_id INTEGER NOT NULL,"
+        " part INTEGER NOT NULL,"
+        " ord INTEGER NOT NULL,"
+        " sku VARCHAR(255) NOT NULL,"
+        " name VARCHAR(512) NOT NULL,"
+        " description TEXT,"
+        " price TEXT,"
+        " active BOOLEAN"
+        ");"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_import_staging_job_id "
+        "ON import_staging (job_id);"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS import_staging;")
@@ -0,0 +1,48 @@
+"""add trigram indexes and full-text search vector to products
+
+Revision ID: base004
+Revises: base003
+Create Date: 2025-01-04 00:00:00
+"""
+from alembic import op
+
+revision = "base004"
+down_revision = "base003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    op.execute(
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', coalesce(sku, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(name, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+        ") STORED;"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_search_vector "
+        "ON products USING gin (search_vector);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_sku_trgm "
+        "ON products USING gin (sku gin_trgm_ops);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_name_trgm "
+        "ON products USING gin (name gin_trgm_ops);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_products_description_trgm "
+        "ON products USING gin (description gin_trgm_ops);"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_products_description_trgm;")
+    op.execute("DROP INDEX IF EXISTS ix_products_name_trgm;")
+    op.execute("DROP INDEX IF EXISTS ix_products_sku_trgm;")
+    op.execute("DROP INDEX IF EXISTS ix_products_search_vector;")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector;")
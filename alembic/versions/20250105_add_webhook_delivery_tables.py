@@ -0,0 +1,53 @@
+"""add webhook delivery queue and dead-letter tables
+
+Revision ID: base005
+Revises: base004
+Create Date: 2025-01-05 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+revision = "base005"
+down_revision = "base004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "webhook_deliveries",
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("webhook_id", sa.Integer, nullable=False),
+        sa.Column("url", sa.String(2048), nullable=False),
+        sa.Column("event_type", sa.String(128), nullable=False),
+        sa.Column("payload", JSONB, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column("last_error", sa.Text),
+        sa.Column("last_status_code", sa.Integer),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_webhook_deliveries_webhook_id", "webhook_deliveries", ["webhook_id"])
+    op.create_index("ix_webhook_deliveries_next_attempt_at", "webhook_deliveries", ["next_attempt_at"])
+
+    op.create_table(
+        "webhook_dead_letters",
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("delivery_id", sa.BigInteger, nullable=False),
+        sa.Column("webhook_id", sa.Integer, nullable=False),
+        sa.Column("url", sa.String(2048), nullable=False),
+        sa.Column("event_type", sa.String(128), nullable=False),
+        sa.Column("payload", JSONB, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("last_error", sa.Text),
+        sa.Column("last_status_code", sa.Integer),
+        sa.Column("created_at", sa.DateTime(timezone=True)),
+        sa.Column("failed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_webhook_dead_letters_webhook_id", "webhook_dead_letters", ["webhook_id"])
+
+
+def downgrade():
+    op.drop_table("webhook_dead_letters")
+    op.drop_table("webhook_deliveries")
@@ -0,0 +1,29 @@
+"""add product_outbox for bulk import change events
+
+Revision ID: base006
+Revises: base005
+Create Date: 2025-01-06 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base006"
+down_revision = "base005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "product_outbox",
+        sa.Column("id", sa.BigInteger, primary_key=True),
+        sa.Column("event_type", sa.String(64), nullable=False),
+        sa.Column("product_id", sa.Integer, nullable=False),
+        sa.Column("sku", sa.String(255), nullable=False),
+        sa.Column("job_id", sa.Integer),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+
+def downgrade():
+    op.drop_table("product_outbox")
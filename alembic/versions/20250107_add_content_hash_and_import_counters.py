@@ -0,0 +1,28 @@
+"""add products.content_hash and per-outcome import counters
+
+Revision ID: base007
+Revises: base006
+Create Date: 2025-01-07 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base007"
+down_revision = "base006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # left NULL on existing rows: the first re-import rewrites them once and fills it in
+    op.add_column("products", sa.Column("content_hash", sa.String(32)))
+    op.add_column("import_jobs", sa.Column("inserted_rows", sa.Integer, server_default="0"))
+    op.add_column("import_jobs", sa.Column("updated_rows", sa.Integer, server_default="0"))
+    op.add_column("import_jobs", sa.Column("unchanged_rows", sa.Integer, server_default="0"))
+
+
+def downgrade():
+    op.drop_column("import_jobs", "unchanged_rows")
+    op.drop_column("import_jobs", "updated_rows")
+    op.drop_column("import_jobs", "inserted_rows")
+    op.drop_column("products", "content_hash")
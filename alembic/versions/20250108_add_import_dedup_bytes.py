@@ -0,0 +1,21 @@
+"""add import_jobs.dedup_bytes
+
+Revision ID: base008
+Revises: base007
+Create Date: 2025-01-08 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base008"
+down_revision = "base007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("import_jobs", sa.Column("dedup_bytes", sa.BigInteger))
+
+
+def downgrade():
+    op.drop_column("import_jobs", "dedup_bytes")
@@ -0,0 +1,27 @@
+"""add import job source and checkpoint columns
+
+Revision ID: base009
+Revises: base008
+Create Date: 2025-01-09 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base009"
+down_revision = "base008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("import_jobs", sa.Column("source", sa.String(512)))
+    op.add_column("import_jobs", sa.Column("checkpoint_offset", sa.BigInteger))
+    op.add_column("import_jobs", sa.Column("checkpoint_rows", sa.Integer))
+    op.add_column("import_jobs", sa.Column("checkpoint_batch", sa.Integer))
+
+
+def downgrade():
+    op.drop_column("import_jobs", "checkpoint_batch")
+    op.drop_column("import_jobs", "checkpoint_rows")
+    op.drop_column("import_jobs", "checkpoint_offset")
+    op.drop_column("import_jobs", "source")
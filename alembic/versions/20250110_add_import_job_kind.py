@@ -0,0 +1,21 @@
+"""add import_jobs.kind
+
+Revision ID: base010
+Revises: base009
+Create Date: 2025-01-10 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base010"
+down_revision = "base009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("import_jobs", sa.Column("kind", sa.String(20), nullable=False, server_default="import"))
+
+
+def downgrade():
+    op.drop_column("import_jobs", "kind")
@@ -0,0 +1,23 @@
+"""add import job profile columns
+
+Revision ID: base011
+Revises: base010
+Create Date: 2025-01-11 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base011"
+down_revision = "base010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("import_jobs", sa.Column("profile_data", sa.LargeBinary))
+    op.add_column("import_jobs", sa.Column("profile_summary", sa.Text))
+
+
+def downgrade():
+    op.drop_column("import_jobs", "profile_summary")
+    op.drop_column("import_jobs", "profile_data")
@@ -0,0 +1,20 @@
+"""add temp_files (filename, chunk_index) index
+
+Revision ID: base012
+Revises: base011
+Create Date: 2025-01-12 00:00:00
+"""
+from alembic import op
+
+revision = "base012"
+down_revision = "base011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_temp_files_filename_chunk_index", "temp_files", ["filename", "chunk_index"])
+
+
+def downgrade():
+    op.drop_index("ix_temp_files_filename_chunk_index", table_name="temp_files")
@@ -0,0 +1,21 @@
+"""add import_jobs.engine
+
+Revision ID: base013
+Revises: base012
+Create Date: 2025-01-13 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base013"
+down_revision = "base012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("import_jobs", sa.Column("engine", sa.String(20)))
+
+
+def downgrade():
+    op.drop_column("import_jobs", "engine")
@@ -0,0 +1,21 @@
+"""add import_jobs.chord_id
+
+Revision ID: base014
+Revises: base013
+Create Date: 2025-01-14 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "base014"
+down_revision = "base013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("import_jobs", sa.Column("chord_id", sa.String(64)))
+
+
+def downgrade():
+    op.drop_column("import_jobs", "chord_id")
@@ -0,0 +1,161 @@
+import csv
+import io
+import itertools
+import os
+import traceback
+from typing import Optional
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.sql import column, table
+from .database import SessionLocal, engine
+from . import models, crud, product_cache, utils
+
+BULK_DELETE_BATCH_ROWS = int(os.getenv("BULK_DELETE_BATCH_ROWS", "10000"))
+BULK_DELETE_DIR = "/tmp/bulk_delete"
+SKU_COPY_ROWS = 100000
+
+CREATE_DELETE_SKUS_SQL = "CREATE TEMP TABLE IF NOT EXISTS delete_skus (sku text NOT NULL)"
+COPY_DELETE_SKUS_SQL = "COPY delete_skus (sku) FROM STDIN WITH (FORMAT csv)"
+
+delete_skus = table("delete_skus", column("sku"))
+
+
+def has_filters(filters: Optional[dict]) -> bool:
+    return bool(filters) and any(v is not None and v != "" for v in filters.values())
+
+
+def create_delete_job() -> int:
+    db = SessionLocal()
+    try:
+        job = models.ImportJob(kind="delete", status="pending", total_rows=0, processed_rows=0)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job.id
+    finally:
+        db.close()
+
+
+def _scope(stmt, filters: Optional[dict], by_sku: bool):
+    """Restrict a select/delete on products to the rows targeted by the job"""
+    stmt = crud.apply_product_filters(stmt, filters)
+    if by_sku:
+        stmt = stmt.where(func.lower(models.Product.sku).in_(select(delete_skus.c.sku)))
+    return stmt
+
+
+def _update_job(conn, job_id: int, **values):
+    """Update the job row on `conn`, commit with whatever else is pending and publish it"""
+    row = conn.execute(
+        update(models.ImportJob)
+        .where(models.ImportJob.id == job_id)
+        .values(**values)
+        .returning(*models.ImportJob.__table__.c)
+    ).one()
+    conn.commit()
+    product_cache.bump_generation()
+    utils.publish_job_progress(row)
+
+
+def load_sku_list(conn, path: str) -> int:
+    """
+    COPY the skus of an uploaded list into the delete_skus temp table.
+    The file is a CSV; a header row naming a "sku" column selects that
+    column, otherwise the first column of every row is taken.
+    """
+    conn.execute(text(CREATE_DELETE_SKUS_SQL))
+    conn.execute(text("TRUNCATE delete_skus"))
+    cur = conn.connection.cursor()
+    loaded = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        first = next(reader, None) or []
+        header = [c.strip().lower() for c in first]
+        if "sku" in header:
+            col = header.index("sku")
+            rows = reader
+        else:
+            col = 0
+            rows = itertools.chain([first], reader)
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        pending = 0
+        for row in rows:
+            if len(row) <= col or not row[col].strip():
+                continue
+            writer.writerow([row[col].strip().lower()])
+            pending += 1
+            if pending >= SKU_COPY_ROWS:
+                buf.seek(0)
+                cur.copy_expert(COPY_DELETE_SKUS_SQL, buf)
+                loaded += pending
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                pending = 0
+        if pending:
+            buf.seek(0)
+            cur.copy_expert(COPY_DELETE_SKUS_SQL, buf)
+            loaded += pending
+    conn.execute(text("ANALYZE delete_skus"))
+    return loaded
+
+
+def run_bulk_delete(job_id: int, filters: Optional[dict] = None, skus_path: Optional[str] = None):
+    """
+    Delete the products matched by `filters` and/or an uploaded sku list in
+    batches of BULK_DELETE_BATCH_ROWS consecutive ids, committing and
+    reporting progress after each batch so no lock is held for long.
+    With no filter at all the table is truncated instead.
+    """
+    by_sku = skus_path is not None
+    with engine.connect() as conn:
+        try:
+            _update_job(conn, job_id, status="deleting", error=None)
+
+            if not has_filters(filters) and not by_sku:
+                total = conn.execute(select(func.count()).select_from(models.Product)).scalar()
+                conn.execute(text("TRUNCATE products"))
+                _update_job(conn, job_id, status="completed", total_rows=total, processed_rows=total)
+                print(f"[DELETE] Job {job_id}: truncated {total} products")
+                return
+
+            if by_sku:
+                loaded = load_sku_list(conn, skus_path)
+                print(f"[DELETE] Job {job_id}: loaded {loaded} skus")
+            total = conn.execute(
+                _scope(select(func.count()).select_from(models.Product), filters, by_sku)
+            ).scalar()
+            _update_job(conn, job_id, total_rows=total)
+
+            deleted = 0
+            lo = 0
+            while True:
+                # upper id of the next batch, so each DELETE touches one bounded id range
+                hi = conn.execute(
+                    _scope(select(models.Product.id).where(models.Product.id > lo), filters, by_sku)
+                    .order_by(models.Product.id)
+                    .offset(BULK_DELETE_BATCH_ROWS - 1)
+                    .limit(1)
+                ).scalar()
+                stmt = delete(models.Product).where(models.Product.id > lo)
+                if hi is not None:
+                    stmt = stmt.where(models.Product.id <= hi)
+                deleted += conn.execute(_scope(stmt, filters, by_sku)).rowcount
+                if hi is None:
+                    break
+                _update_job(conn, job_id, processed_rows=deleted)
+                lo = hi
+
+            _update_job(conn, job_id, status="completed", processed_rows=deleted)
+            print(f"[DELETE] Job {job_id}: deleted {deleted} products")
+
+        except Exception as e:
+            conn.rollback()
+            _update_job(conn, job_id, status="failed", error=str(e))
+            print("ERROR:", traceback.format_exc())
+        finally:
+            if by_sku:
+                conn.execute(text("DROP TABLE IF EXISTS delete_skus"))
+                conn.commit()
+                if os.path.exists(skus_path):
+                    os.remove(skus_path)
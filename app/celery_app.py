@@ -1,6 +1,7 @@
 from celery import Celery
 import os
 from dotenv import load_dotenv
+from .metrics import install_celery_metrics
 
 load_dotenv()
 
@@ -23,7 +24,32 @@ celery.conf.update(
 )
 
 celery.conf.task_routes = {
+    "app.tasks.trigger_webhook": {"queue": "webhook_queue"},
+    "app.tasks.deliver_webhook_event": {"queue": "webhook_queue"},
+    "app.tasks.drain_product_outbox": {"queue": "webhook_queue"},
+    "app.tasks.dispatch_webhook_deliveries": {"queue": "webhook_queue"},
     "app.tasks.*": {"queue": "import_queue"},
 }
 
+celery.conf.beat_schedule = {
+    "dispatch-webhook-deliveries": {
+        "task": "app.tasks.dispatch_webhook_deliveries",
+        "schedule": float(os.getenv("WEBHOOK_DISPATCH_INTERVAL_SECONDS", "5")),
+    },
+    "drain-product-outbox": {
+        "task": "app.tasks.drain_product_outbox",
+        "schedule": float(os.getenv("OUTBOX_DRAIN_INTERVAL_SECONDS", "5")),
+    },
+    "cleanup-old-csv-files": {
+        "task": "app.tasks.cleanup_old_csv_files",
+        "schedule": float(os.getenv("CLEANUP_INTERVAL_SECONDS", "3600")),
+    },
+    "cleanup-upload-sessions": {
+        "task": "app.tasks.cleanup_upload_sessions",
+        "schedule": float(os.getenv("CLEANUP_INTERVAL_SECONDS", "3600")),
+    },
+}
+
+install_celery_metrics()
+
 celery.autodiscover_tasks(["app"])
\ No newline at end of file
@@ -1,52 +1,502 @@
 from sqlalchemy.orm import Session
-from . import models, schemas
-from sqlalchemy import select, update, delete, func
-from typing import List, Optional
+from . import models, schemas, metrics, product_cache, webhook_registry
+from sqlalchemy import select, update, delete, func, or_
+from typing import List, Optional, Tuple
+import base64
+import binascii
+import io
+import json
+import os
 
-def create_or_update_products_bulk(db: Session, rows: List[dict]):
+UPSERT_BATCH_ROWS = int(os.getenv("UPSERT_BATCH_ROWS", "5000"))
+UPSERT_BATCH_BYTES = int(os.getenv("UPSERT_BATCH_BYTES", str(16 * 1024 * 1024)))
+
+STAGING_COLUMNS = ("ord", "sku", "name", "description", "price", "active")
+
+CREATE_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS products_staging (
+    ord integer NOT NULL,
+    sku varchar(255) NOT NULL,
+    name varchar(512) NOT NULL,
+    description text,
+    price text,
+    active boolean
+) ON COMMIT DELETE ROWS
+"""
+
+COPY_STAGING_SQL = "COPY products_staging (%s) FROM STDIN" % ", ".join(STAGING_COLUMNS)
+
+OUTBOX_EVENT_TYPES = ("product.created", "product.updated")
+
+# Hash of the mutable columns; a re-import of an identical row leaves it untouched.
+CONTENT_HASH_SQL = "md5(row(name, description, left(price, 64), coalesce(active, true))::text)"
+
+def _merge_sql(source: str, order_by: str, outbox: bool = False, per_row: bool = False) -> str:
+    """
+    Build the staging -> products merge. DISTINCT ON keeps the last occurrence
+    of each sku, so a batch that repeats a sku never hits the same row twice
+    in ON CONFLICT. Rows whose content hash is unchanged are skipped, so they
+    cost no write, WAL or dead tuple. With `outbox`, every inserted/updated
+    row is also recorded in product_outbox by the same statement.
+    The statement returns one row: (staged, inserted, updated), or with
+    `per_row` one (ord, product id, outcome) row per surviving staged row.
+    """
+    outbox_cte = """,
+outbox AS (
+  INSERT INTO product_outbox (event_type, product_id, sku, job_id)
+  SELECT CASE WHEN inserted THEN 'product.created' ELSE 'product.updated' END, id, sku, %(job_id)s
+  FROM upserted
+)""" if outbox else ""
+    if per_row:
+        # products is read from the statement snapshot, so it holds ids of unchanged rows
+        select = """SELECT src.ord, coalesce(u.id, p.id),
+       CASE WHEN u.inserted THEN 'inserted' WHEN u.id IS NOT NULL THEN 'updated' ELSE 'unchanged' END
+FROM src
+LEFT JOIN upserted u ON lower(u.sku) = lower(src.sku)
+LEFT JOIN products p ON lower(p.sku) = lower(src.sku)
+"""
+    else:
+        select = """SELECT (SELECT count(*) FROM src),
+       count(*) FILTER (WHERE inserted),
+       count(*) FILTER (WHERE NOT inserted)
+FROM upserted
+"""
+    return f"""
+WITH src AS (
+  SELECT DISTINCT ON (lower(sku)) ord, sku, name, description, left(price, 64) AS price,
+         coalesce(active, true) AS active, {CONTENT_HASH_SQL} AS content_hash
+  FROM {source}
+  ORDER BY lower(sku), {order_by}
+),
+upserted AS (
+  INSERT INTO products (sku, name, description, price, active, content_hash, created_at, updated_at)
+  SELECT sku, name, description, price, active, content_hash, now(), now()
+  FROM src
+  ON CONFLICT (lower(sku)) DO UPDATE
+    SET name = EXCLUDED.name,
+        description = EXCLUDED.description,
+        price = EXCLUDED.price,
+        active = EXCLUDED.active,
+        content_hash = EXCLUDED.content_hash,
+        updated_at = now()
+    WHERE products.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+  RETURNING id, sku, (xmax = 0) AS inserted
+){outbox_cte}
+{select}"""
+
+def new_upsert_counts() -> dict:
+    return {"inserted": 0, "updated": 0, "unchanged": 0}
+
+def _add_merge_counts(counts: dict, cur) -> dict:
+    staged, inserted, updated = cur.fetchone()
+    counts["inserted"] += inserted
+    counts["updated"] += updated
+    counts["unchanged"] += staged - inserted - updated
+    return counts
+
+MERGE_STAGING_SQL = _merge_sql("products_staging", "ord DESC")
+MERGE_STAGING_OUTBOX_SQL = _merge_sql("products_staging", "ord DESC", outbox=True)
+MERGE_STAGING_ROWS_SQL = _merge_sql("products_staging", "ord DESC", per_row=True)
+MERGE_STAGING_ROWS_OUTBOX_SQL = _merge_sql("products_staging", "ord DESC", outbox=True, per_row=True)
+
+def outbox_enabled() -> bool:
+    """Only pay for outbox rows while someone subscribes to product changes"""
+    return any(webhook_registry.registry.get(event_type) for event_type in OUTBOX_EVENT_TYPES)
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\x00": ""})
+COPY_ESCAPES_CHARS = tuple(chr(c) for c in COPY_ESCAPES)
+
+def _copy_value(value) -> str:
+    """Encode one value in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).translate(COPY_ESCAPES)
+
+def _iter_copy_batches(rows: List[dict], max_rows: int, max_bytes: int,
+                       prefix: str = "", start_ord: int = 0):
     """
-    Bulk upsert using SQL ON CONFLICT on lower(sku).
-    We generate a VALUES statement and use Postgres ON CONFLICT.
+    Yield (buffer, count) pairs of COPY-encoded rows, cutting a new buffer
+    whenever either the row or the (approximate, character-counted) byte limit is hit.
+    `prefix` is prepended verbatim to every line, for leading constant columns.
+    """
+    buf = io.StringIO()
+    count = 0
+    size = 0
+    for ord_, r in enumerate(rows, start_ord):
+        line = prefix + "\t".join((
+            str(ord_),
+            _copy_value(r["sku"]),
+            _copy_value(r["name"]),
+            _copy_value(r.get("description")),
+            _copy_value(r.get("price")),
+            _copy_value(r.get("active")),
+        )) + "\n"
+        buf.write(line)
+        count += 1
+        size += len(line)
+        if count >= max_rows or size >= max_bytes:
+            buf.seek(0)
+            yield buf, count
+            buf = io.StringIO()
+            count = 0
+            size = 0
+    if count:
+        buf.seek(0)
+        yield buf, count
+
+def upsert_staged_batch(cur, buf, counts: dict, emit_events: bool = False,
+                        job_id: Optional[int] = None, results: Optional[list] = None) -> dict:
+    """
+    COPY one encoded batch into the staging table and merge it into products.
+    If `results` is a list, (ord, product id, outcome) is appended to it for
+    every row that was not superseded by a later row with the same sku.
+    """
+    cur.execute(CREATE_STAGING_SQL)
+    cur.copy_expert(COPY_STAGING_SQL, buf)
+    if results is None:
+        cur.execute(MERGE_STAGING_OUTBOX_SQL if emit_events else MERGE_STAGING_SQL, {"job_id": job_id})
+        _add_merge_counts(counts, cur)
+    else:
+        cur.execute(MERGE_STAGING_ROWS_OUTBOX_SQL if emit_events else MERGE_STAGING_ROWS_SQL, {"job_id": job_id})
+        for row in cur.fetchall():
+            counts[row[2]] += 1
+            results.append(row)
+    cur.execute("TRUNCATE products_staging")
+    return counts
+
+def create_or_update_products_bulk(db: Session, rows: List[dict],
+                                   batch_rows: Optional[int] = None,
+                                   batch_bytes: Optional[int] = None,
+                                   job_id: Optional[int] = None,
+                                   emit_events: Optional[bool] = None,
+                                   results: Optional[list] = None):
     """
+    Bulk upsert using a COPY-loaded temp staging table.
+    Rows are streamed into products_staging with COPY FROM STDIN in batches
+    bounded by row count and size, then merged with a single
+    INSERT ... SELECT ... ON CONFLICT (lower(sku)) per batch.
+    Change events go to product_outbox when `emit_events` (default: when
+    anyone subscribes to product.created/updated).
+    `results` collects per-row outcomes, see upsert_staged_batch; ord is
+    the row's index in `rows`.
+    Returns {"inserted", "updated", "unchanged"} counts.
+    """
+    counts = new_upsert_counts()
+    if not rows:
+        return counts
+
+    max_rows = batch_rows or UPSERT_BATCH_ROWS
+    max_bytes = batch_bytes or UPSERT_BATCH_BYTES
+    if emit_events is None:
+        emit_events = outbox_enabled()
+
+    raw_conn = db.bind.raw_connection()
+    try:
+        with raw_conn.cursor() as cur:
+            for buf, _ in _iter_copy_batches(rows, max_rows, max_bytes):
+                upsert_staged_batch(cur, buf, counts, emit_events=emit_events, job_id=job_id, results=results)
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    product_cache.bump_generation()
+    return counts
+
+PREPARE_MERGE_SQL = "PREPARE import_merge AS " + MERGE_STAGING_SQL
+PREPARE_MERGE_OUTBOX_SQL = ("PREPARE import_merge(integer) AS "
+                            + MERGE_STAGING_OUTBOX_SQL.replace("%(job_id)s", "$1"))
+
+PROGRESS_COLUMNS = ("kind", "status", "processed", "total", "inserted", "updated", "unchanged", "dedup_bytes", "error")
+
+PREPARE_PROGRESS_SQL = """
+PREPARE import_progress(integer, integer, integer, integer, integer, integer, bigint, integer, bigint) AS
+UPDATE import_jobs
+   SET processed_rows = $2,
+       total_rows = $3,
+       inserted_rows = $4,
+       updated_rows = $5,
+       unchanged_rows = $6,
+       checkpoint_offset = $7,
+       checkpoint_rows = $3,
+       checkpoint_batch = $8,
+       dedup_bytes = $9,
+       updated_at = now()
+ WHERE id = $1
+RETURNING kind, status, processed_rows, total_rows, inserted_rows, updated_rows, unchanged_rows, dedup_bytes, error
+"""
+
+class ImportSession:
+    """
+    One connection and cursor for the whole of a serial import. The merge and
+    the job progress update are prepared once on the server, and each batch
+    commits its products, outbox rows and job checkpoint in one transaction,
+    so progress never runs ahead of (or behind) the committed data.
+    """
+
+    def __init__(self, bind, job_id: int, emit_events: Optional[bool] = None,
+                 batch_rows: Optional[int] = None, batch_bytes: Optional[int] = None):
+        self.job_id = job_id
+        self.emit_events = outbox_enabled() if emit_events is None else emit_events
+        self.batch_rows = batch_rows or UPSERT_BATCH_ROWS
+        self.batch_bytes = batch_bytes or UPSERT_BATCH_BYTES
+        self._conn = bind.raw_connection()
+        self._cur = None
+
+    def __enter__(self):
+        try:
+            cur = self._conn.cursor()
+            cur.execute(CREATE_STAGING_SQL)
+            cur.execute(PREPARE_MERGE_OUTBOX_SQL if self.emit_events else PREPARE_MERGE_SQL)
+            cur.execute(PREPARE_PROGRESS_SQL)
+            self._conn.commit()
+        except Exception:
+            self._conn.invalidate()
+            self._conn.close()
+            raise
+        self._cur = cur
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def upsert(self, rows: List[dict]) -> dict:
+        """Merge rows into products inside the open transaction; returns the batch counts."""
+        counts = new_upsert_counts()
+        batches = _iter_copy_batches(rows, self.batch_rows, self.batch_bytes)
+        while True:
+            with metrics.import_stage("encode"):
+                encoded = next(batches, None)
+            if encoded is None:
+                break
+            self._merge(encoded[0], counts)
+        return counts
+
+    def upsert_encoded(self, buf) -> dict:
+        """Like upsert, for rows already encoded as products_staging COPY text lines."""
+        return self._merge(buf, new_upsert_counts())
+
+    def _merge(self, buf, counts: dict) -> dict:
+        with metrics.import_stage("copy"):
+            self._cur.copy_expert(COPY_STAGING_SQL, buf)
+        with metrics.import_stage("merge"):
+            if self.emit_events:
+                self._cur.execute("EXECUTE import_merge(%s)", (self.job_id,))
+            else:
+                self._cur.execute("EXECUTE import_merge")
+            _add_merge_counts(counts, self._cur)
+            self._cur.execute("TRUNCATE products_staging")
+        return counts
+
+    def commit(self, processed: int, total: int, counts: dict, offset: int,
+               batch: int, dedup_bytes: Optional[int] = None) -> dict:
+        """Record progress and checkpoint, commit with the pending data and return the job's progress payload."""
+        self._cur.execute(
+            "EXECUTE import_progress(%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            (self.job_id, processed, total, counts["inserted"], counts["updated"],
+             counts["unchanged"], offset, batch, dedup_bytes),
+        )
+        row = self._cur.fetchone()
+        with metrics.import_stage("commit"):
+            self._conn.commit()
+        product_cache.bump_generation()
+        return dict(zip(PROGRESS_COLUMNS, row))
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.rollback()
+            if self._cur is not None:
+                # the connection goes back to the pool, which must not see our statements
+                self._cur.execute("DEALLOCATE ALL")
+                self._conn.commit()
+                self._cur.close()
+        except Exception:
+            self._conn.invalidate()
+        finally:
+            self._conn.close()
+            self._conn = None
+
+IMPORT_STAGING_COLUMNS = ("job_id", "part") + STAGING_COLUMNS
+
+COPY_IMPORT_STAGING_SQL = "COPY import_staging (%s) FROM STDIN" % ", ".join(IMPORT_STAGING_COLUMNS)
+
+# Parallel imports stage every range first and merge once, ordering by
+# (part, ord) so the last occurrence in the file wins, as in a serial run.
+MERGE_IMPORT_STAGING_SQL = _merge_sql("import_staging WHERE job_id = %(job_id)s", "part DESC, ord DESC")
+MERGE_IMPORT_STAGING_OUTBOX_SQL = _merge_sql("import_staging WHERE job_id = %(job_id)s",
+                                             "part DESC, ord DESC", outbox=True)
+
+def stage_products_bulk(db: Session, job_id: int, part: int, rows: List[dict], start_ord: int = 0):
+    """COPY one range's rows into import_staging for a later merge_staged_products."""
     if not rows:
         return 0
 
-    conn = db.bind
-    insert_stmt = """
-    INSERT INTO products (sku, name, description, active, created_at, updated_at)
-    VALUES %s
-    ON CONFLICT (lower(sku)) DO UPDATE
-      SET name = EXCLUDED.name,
-          description = EXCLUDED.description,
-          active = EXCLUDED.active,
-          updated_at = now()
-    """
-    
-    raw_conn = conn.raw_connection()
+    prefix = "%d\t%d\t" % (job_id, part)
+    raw_conn = db.bind.raw_connection()
     try:
         with raw_conn.cursor() as cur:
-            args_str = ",".join(cur.mogrify("(%s,%s,%s,%s,now(),now())",
-                                            (r['sku'], r['name'], r.get('description'), r.get('active'))).decode('utf-8')
-                                for r in rows)
-            cur.execute(insert_stmt % args_str)
+            for buf, _ in _iter_copy_batches(rows, UPSERT_BATCH_ROWS, UPSERT_BATCH_BYTES,
+                                             prefix=prefix, start_ord=start_ord):
+                cur.copy_expert(COPY_IMPORT_STAGING_SQL, buf)
         raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
     finally:
         raw_conn.close()
     return len(rows)
 
-def get_products(db: Session, limit: int = 20, offset: int = 0, filters: dict = None):
-    q = db.query(models.Product)
+def merge_staged_products(db: Session, job_id: int) -> dict:
+    """
+    Merge every staged row of a job into products and clear its staging rows.
+    Returns {"inserted", "updated", "unchanged"} counts.
+    """
+    counts = new_upsert_counts()
+    raw_conn = db.bind.raw_connection()
+    try:
+        with raw_conn.cursor() as cur:
+            merge_sql = MERGE_IMPORT_STAGING_OUTBOX_SQL if outbox_enabled() else MERGE_IMPORT_STAGING_SQL
+            cur.execute(merge_sql, {"job_id": job_id})
+            _add_merge_counts(counts, cur)
+            cur.execute("DELETE FROM import_staging WHERE job_id = %(job_id)s", {"job_id": job_id})
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+    product_cache.bump_generation()
+    return counts
+
+def discard_staged_products(db: Session, job_id: int):
+    db.query(models.ImportStaging).filter(models.ImportStaging.job_id == job_id).delete(synchronize_session=False)
+    db.commit()
+
+def apply_product_filters(stmt, filters: Optional[dict]):
+    """Apply the list/search filters shared by every product listing to a select()"""
     if filters:
         if filters.get("sku"):
-            q = q.filter(func.lower(models.Product.sku).like(f"%{filters['sku'].lower()}%"))
+            stmt = stmt.where(models.Product.sku.ilike(f"%{filters['sku']}%"))
         if filters.get("name"):
-            q = q.filter(models.Product.name.ilike(f"%{filters['name']}%"))
+            stmt = stmt.where(models.Product.name.ilike(f"%{filters['name']}%"))
         if filters.get("active") is not None:
-            q = q.filter(models.Product.active == filters['active'])
+            stmt = stmt.where(models.Product.active == filters['active'])
         if filters.get("description"):
-            q = q.filter(models.Product.description.ilike(f"%{filters['description']}%"))
-    total = q.count()
-    items = q.order_by(models.Product.id.desc()).offset(offset).limit(limit).all()
+            stmt = stmt.where(models.Product.description.ilike(f"%{filters['description']}%"))
+    return stmt
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str) -> int:
+    """Return the last seen id from an opaque cursor, or raise ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        return int(json.loads(raw)["id"])
+    except (binascii.Error, KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+# columns a list response may project with ?fields=
+PRODUCT_FIELDS = ("id", "sku", "name", "description", "price", "active", "created_at", "updated_at")
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Validate a comma-separated field list; None or empty selects every PRODUCT_FIELDS column"""
+    names = tuple(dict.fromkeys(f.strip() for f in (fields or "").split(",") if f.strip()))
+    unknown = [name for name in names if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names or PRODUCT_FIELDS
+
+def product_page_stmt(filters: Optional[dict] = None, limit: int = 20,
+                      after: Optional[str] = None, offset: int = 0,
+                      fields: Optional[Tuple[str, ...]] = None):
+    """
+    Build the page query shared by list endpoints: newest first by id.
+    With `after` it is a keyset page (id < last seen id) and `offset` is ignored.
+    One extra row is fetched so callers can tell whether a next page exists.
+    With `fields` it selects plain rows of those columns in that order,
+    followed by id when it is not among them (split_page needs it).
+    """
+    if fields is None:
+        columns = [models.Product]
+    else:
+        columns = [getattr(models.Product, name) for name in fields]
+        if "id" not in fields:
+            columns.append(models.Product.id)
+    stmt = apply_product_filters(select(*columns), filters)
+    if after:
+        stmt = stmt.where(models.Product.id < decode_cursor(after))
+    elif offset:
+        stmt = stmt.offset(offset)
+    return stmt.order_by(models.Product.id.desc()).limit(limit + 1)
+
+def product_count_stmt(filters: Optional[dict] = None):
+    return apply_product_filters(select(func.count(models.Product.id)), filters)
+
+def split_page(rows: list, limit: int):
+    """Trim the look-ahead row and return (items, next_cursor)"""
+    if len(rows) > limit:
+        items = rows[:limit]
+        return items, encode_cursor(items[-1].id) if items else None
+    return rows, None
+
+def paginate_products(db: Session, limit: int = 20, filters: dict = None,
+                      after: Optional[str] = None, offset: int = 0):
+    rows = db.execute(product_page_stmt(filters, limit, after=after, offset=offset)).scalars().all()
+    return split_page(rows, limit)
+
+HIGHLIGHT_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+
+def search_products(db: Session, q: str, limit: int = 20, active: Optional[bool] = None):
+    """
+    Ranked search over sku/name/description. Full-text matches use the
+    search_vector GIN index and substring matches the pg_trgm indexes; rows
+    are ranked by ts_rank plus trigram similarity. Highlights are only
+    computed for the page that is returned.
+    """
+    tsq = func.websearch_to_tsquery("simple", q)
+    p = models.Product
+    rank = (
+        func.ts_rank_cd(p.search_vector, tsq)
+        + func.greatest(func.similarity(p.sku, q), func.similarity(p.name, q))
+    ).label("rank")
+
+    matches = (
+        select(p.id, rank)
+        .where(or_(
+            p.search_vector.op("@@")(tsq),
+            p.sku.icontains(q, autoescape=True),
+            p.name.icontains(q, autoescape=True),
+            p.description.icontains(q, autoescape=True),
+        ))
+        .order_by(rank.desc(), p.id.desc())
+        .limit(limit)
+    )
+    if active is not None:
+        matches = matches.where(p.active == active)
+    matches = matches.subquery()
+
+    stmt = (
+        select(
+            p.id, p.sku, p.name, p.description, p.price, p.active, matches.c.rank,
+            func.ts_headline("simple", p.name, tsq, HIGHLIGHT_OPTIONS).label("name_highlight"),
+            func.ts_headline("simple", func.coalesce(p.description, ""), tsq,
+                             HIGHLIGHT_OPTIONS).label("description_highlight"),
+        )
+        .join(matches, matches.c.id == p.id)
+        .order_by(matches.c.rank.desc(), p.id.desc())
+    )
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+def get_products(db: Session, limit: int = 20, offset: int = 0, filters: dict = None):
+    total = db.execute(product_count_stmt(filters)).scalar()
+    items, _ = paginate_products(db, limit, filters, offset=offset)
     return total, items
 
 def get_webhooks(db: Session):
@@ -1,8 +1,12 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 import os
 from dotenv import load_dotenv
+from .metrics import timed_pool_class
 
 load_dotenv()
 
@@ -10,6 +14,46 @@ import os
 DATABASE_URL = os.environ.get("DATABASE_URL")
 REDIS_URL = os.environ.get("REDIS_URL") or os.environ.get("CELERY_BROKER_URL")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+# prepared statements cached per asyncpg connection; set to 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "500"))
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, poolclass=timed_pool_class(QueuePool, "sync"))
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 Base = declarative_base()
+
+
+def _async_engine_args(url: str):
+    """Point a libpq-style URL at asyncpg, translating the options asyncpg spells differently"""
+    url = make_url(url)
+    query = dict(url.query)
+    connect_args = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    sslmode = query.pop("sslmode", None)
+    if sslmode:
+        # asyncpg takes the libpq mode names, so prefer/allow still fall back to plain connections
+        connect_args["ssl"] = sslmode
+    query["prepared_statement_cache_size"] = str(DB_STATEMENT_CACHE_SIZE)
+    url = url.set(drivername="postgresql+asyncpg", query=query)
+    return url, connect_args
+
+
+_async_url, _async_connect_args = _async_engine_args(DATABASE_URL)
+async_engine = create_async_engine(
+    _async_url,
+    poolclass=timed_pool_class(AsyncAdaptedQueuePool, "async"),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+    connect_args=_async_connect_args,
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
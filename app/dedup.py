@@ -0,0 +1,98 @@
+import zlib
+from array import array
+from typing import Optional
+
+_MASK64 = (1 << 64) - 1
+
+
+class SkuIndex:
+    """
+    Compact map from normalized SKU to the ordinal of its last occurrence.
+
+    Open addressing with linear probing over three flat arrays: a 64-bit
+    hash of the SKU (0 marks an empty slot), an independent 32-bit CRC
+    fingerprint, and a 32-bit ordinal, i.e. 16 bytes per slot instead of a
+    Python string per SKU. Two SKUs whose 64-bit hashes collide are told
+    apart by the fingerprint and the newcomer is kept exactly in a small
+    overflow dict.
+
+    Keys use the builtin str hash, which is only stable inside one process,
+    so an index must be built and queried by the same process.
+    """
+
+    MAX_LOAD = 0.75
+
+    def __init__(self, capacity: int = 1 << 16):
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self._alloc(size)
+        self._count = 0
+        self._overflow = {}
+
+    def _alloc(self, size: int):
+        self._mask = size - 1
+        self._keys = array("Q", bytes(8 * size))
+        self._tags = array("I", bytes(4 * size))
+        self._values = array("I", bytes(4 * size))
+
+    @staticmethod
+    def _hash(sku: str):
+        key = hash(sku) & _MASK64
+        return key or 1, zlib.crc32(sku.encode("utf-8"))
+
+    def _find(self, key: int) -> int:
+        keys = self._keys
+        mask = self._mask
+        i = key & mask
+        while True:
+            k = keys[i]
+            if k == 0 or k == key:
+                return i
+            i = (i + 1) & mask
+
+    def record(self, sku: str, ordinal: int):
+        """Remember `ordinal` as the latest occurrence of `sku`."""
+        key, tag = self._hash(sku)
+        i = self._find(key)
+        if self._keys[i] == 0:
+            self._keys[i] = key
+            self._tags[i] = tag
+            self._values[i] = ordinal
+            self._count += 1
+            if self._count > self.MAX_LOAD * (self._mask + 1):
+                self._grow()
+        elif self._tags[i] == tag:
+            self._values[i] = ordinal
+        else:
+            self._overflow[sku] = ordinal
+
+    def last(self, sku: str) -> Optional[int]:
+        """Ordinal of the last recorded occurrence of `sku`, or None."""
+        key, tag = self._hash(sku)
+        i = self._find(key)
+        if self._keys[i] == 0:
+            return None
+        if self._tags[i] == tag:
+            return self._values[i]
+        return self._overflow.get(sku)
+
+    def _grow(self):
+        keys, tags, values = self._keys, self._tags, self._values
+        self._alloc(len(keys) * 2)
+        for i, key in enumerate(keys):
+            if key:
+                j = self._find(key)
+                self._keys[j] = key
+                self._tags[j] = tags[i]
+                self._values[j] = values[i]
+
+    def __len__(self):
+        return self._count + len(self._overflow)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index."""
+        arrays = sum(a.itemsize * len(a) for a in (self._keys, self._tags, self._values))
+        overflow = sum(len(s) + 100 for s in self._overflow)
+        return arrays + overflow
@@ -0,0 +1,134 @@
+import os
+import queue
+import threading
+import zlib
+from typing import Optional
+from sqlalchemy import select
+from .database import engine
+from . import models, crud
+
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_COLUMNS = ("id", "sku", "name", "description", "price", "active", "created_at", "updated_at")
+# rows per round trip of the NDJSON server-side cursor
+EXPORT_FETCH_ROWS = int(os.getenv("EXPORT_FETCH_ROWS", "10000"))
+# the producer hands data over in pieces of about this size, at most EXPORT_QUEUE_PIECES ahead
+EXPORT_PIECE_BYTES = int(os.getenv("EXPORT_PIECE_BYTES", str(256 * 1024)))
+EXPORT_QUEUE_PIECES = int(os.getenv("EXPORT_QUEUE_PIECES", "16"))
+EXPORT_GZIP_LEVEL = 6
+
+_DONE = object()
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class QueueWriter:
+    """
+    File-like sink for copy_expert that forwards data to the response
+    through a bounded queue, so the database is read only as fast as the
+    client consumes and memory stays at a few pieces per export.
+    """
+
+    def __init__(self, pieces: queue.Queue, cancelled: threading.Event):
+        self._pieces = pieces
+        self._cancelled = cancelled
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        if len(self._buf) >= EXPORT_PIECE_BYTES:
+            self._put(bytes(self._buf))
+            self._buf = bytearray()
+
+    def finish(self):
+        if self._buf:
+            self._put(bytes(self._buf))
+            self._buf = bytearray()
+        self._put(_DONE)
+
+    def fail(self, exc: BaseException):
+        try:
+            self._put(exc)
+        except ExportCancelled:
+            pass
+
+    def _put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                # raising out of write() aborts the COPY on the server
+                raise ExportCancelled()
+            try:
+                self._pieces.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+def export_query(filters: Optional[dict] = None):
+    """Render the filtered export select as (sql, params) for the psycopg2 cursor"""
+    columns = [getattr(models.Product, c) for c in EXPORT_COLUMNS]
+    stmt = crud.apply_product_filters(select(*columns), filters).order_by(models.Product.id)
+    compiled = stmt.compile(dialect=engine.dialect)
+    return str(compiled), compiled.params
+
+
+def _produce(fmt: str, filters: Optional[dict], writer: QueueWriter):
+    sql, params = export_query(filters)
+    conn = engine.raw_connection()
+    try:
+        if fmt == "csv":
+            with conn.cursor() as cur:
+                query = cur.mogrify(sql, params).decode()
+                cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", writer)
+        else:
+            # COPY text format would escape the backslashes in the JSON, so rows
+            # come through a named (server-side) cursor instead
+            with conn.cursor(name="product_export") as cur:
+                cur.itersize = EXPORT_FETCH_ROWS
+                cur.execute(f"SELECT row_to_json(t)::text FROM ({sql}) t", params)
+                while True:
+                    rows = cur.fetchmany(EXPORT_FETCH_ROWS)
+                    if not rows:
+                        break
+                    writer.write("".join(r[0] + "\n" for r in rows).encode("utf-8"))
+        conn.rollback()
+        writer.finish()
+    except ExportCancelled:
+        conn.rollback()
+    except Exception as e:
+        conn.rollback()
+        writer.fail(e)
+    finally:
+        conn.close()
+
+
+def stream_products(fmt: str = "csv", filters: Optional[dict] = None, compress: bool = False):
+    """
+    Yield the filtered catalog as CSV (with header) or NDJSON, optionally
+    gzipped. A worker thread runs the query and feeds a bounded queue;
+    closing the generator early cancels the query.
+    """
+    pieces = queue.Queue(maxsize=EXPORT_QUEUE_PIECES)
+    cancelled = threading.Event()
+    writer = QueueWriter(pieces, cancelled)
+    producer = threading.Thread(target=_produce, args=(fmt, filters, writer),
+                                name="product-export", daemon=True)
+    producer.start()
+
+    gz = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    try:
+        while True:
+            item = pieces.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            if gz is not None:
+                item = gz.compress(item)
+            if item:
+                yield item
+        if gz is not None:
+            yield gz.flush()
+    finally:
+        cancelled.set()
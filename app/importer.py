@@ -0,0 +1,483 @@
+import csv
+import io
+import os
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+import time
+from . import database, models, crud, metrics, utils
+from .dedup import SkuIndex
+
+READ_BUFFER_SIZE = 1024 * 1024
+
+# "rows" parses with csv.DictReader row by row, "columnar" with pandas (see columnar.py)
+IMPORT_ENGINES = ("rows", "columnar")
+IMPORT_ENGINE = os.getenv("IMPORT_ENGINE", "rows")
+
+
+class ChunkFileStream(io.RawIOBase):
+    """Read a list of chunk files one after another as a single byte stream."""
+
+    def __init__(self, paths: List[str]):
+        self._paths = list(paths)
+        self._index = 0
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._index < len(self._paths):
+            if self._current is None:
+                self._current = open(self._paths[self._index], "rb")
+            n = self._current.readinto(b)
+            if n:
+                return n
+            self._current.close()
+            self._current = None
+            self._index += 1
+        return 0
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+def list_chunk_files(upload_dir: str) -> List[str]:
+    chunks = sorted(
+        [f for f in os.listdir(upload_dir) if f.startswith("chunk_")],
+        key=lambda x: int(x.split("_")[1])
+    )
+    return [os.path.join(upload_dir, f) for f in chunks]
+
+
+def open_buffered(raw):
+    if isinstance(raw, io.RawIOBase):
+        raw = io.BufferedReader(raw, buffer_size=READ_BUFFER_SIZE)
+    return raw
+
+
+def open_csv_text(raw) -> io.TextIOWrapper:
+    """Wrap a raw byte stream so it is decoded incrementally for csv."""
+    return io.TextIOWrapper(open_buffered(raw), encoding="utf-8", newline="")
+
+
+def iter_lines_with_offsets(stream, position: dict, resume_offset: int = 0):
+    """
+    Yield decoded lines of a buffered binary stream, keeping position["offset"]
+    at the byte just past the last line handed out. csv.reader never reads
+    past the end of the record it returns, so after each row the offset is
+    exactly that record's end. Lines end at \n, \r\n or a bare \r, as with
+    open_csv_text, so files with CR-only line endings read the same way.
+    After the first line (the header) everything up to `resume_offset` is
+    skipped; the stream is read ahead, so callers must not skip on it.
+    """
+    pending = b""
+    header = True
+    eof = False
+    while not eof:
+        data = stream.read(READ_BUFFER_SIZE)
+        eof = not data
+        lines = (pending + data).splitlines(keepends=True)
+        pending = b""
+        if not eof and lines and not lines[-1].endswith(b"\n"):
+            # cut mid-line, or a \r whose \n is still to come
+            pending = lines.pop()
+        for i, line in enumerate(lines):
+            position["offset"] += len(line)
+            yield line.decode("utf-8")
+            if header:
+                header = False
+                skip = resume_offset - position["offset"]
+                if skip > 0:
+                    rest = b"".join(lines[i + 1:]) + pending
+                    if skip > len(rest):
+                        skip_bytes(stream, skip - len(rest))
+                    pending = rest[skip:]
+                    position["offset"] = resume_offset
+                    eof = False
+                    break
+
+
+def skip_bytes(stream, n: int):
+    if stream.seekable():
+        stream.seek(n, io.SEEK_CUR)
+        return
+    while n > 0:
+        data = stream.read(min(n, READ_BUFFER_SIZE))
+        if not data:
+            break
+        n -= len(data)
+
+
+def normalize_row(row: dict) -> Optional[dict]:
+    sku = row.get("sku")
+    if not sku or not sku.strip():
+        return None
+    return {
+        "sku": sku.strip(),
+        "name": (row.get("name") or "").strip()[:512],
+        "description": (row.get("description") or "")[:2000],
+        "price": row.get("price") if "price" in row else None,
+        "active": True,
+    }
+
+
+def build_sku_index(text_stream) -> SkuIndex:
+    """
+    First pass: map every normalized sku to the ordinal of its last valid
+    row, counting rows exactly as normalize_row accepts them.
+    """
+    index = SkuIndex()
+    reader = csv.reader(text_stream)
+    header = next(reader, [])
+    if "sku" not in header:
+        return index
+    col = len(header) - 1 - header[::-1].index("sku")
+
+    # ordinals are data row numbers, as counted by DictReader in the second pass
+    ordinal = 0
+    for row in reader:
+        if not row:
+            continue
+        ordinal += 1
+        if len(row) <= col:
+            continue
+        sku = row[col].strip()
+        if sku:
+            index.record(sku.lower(), ordinal)
+    return index
+
+
+def import_csv(db: Session, job: models.ImportJob, open_source, batch_size: int = None,
+               engine: Optional[str] = None):
+    """
+    Import a CSV in two passes over `open_source()` (a fresh binary stream
+    per call). The first pass builds a file-wide SkuIndex; the second upserts
+    in batches only the last occurrence of every sku through an ImportSession,
+    which commits job progress and its checkpoint with every batch.
+    If the job has a checkpoint, the second pass resumes from it.
+    `engine` picks one of IMPORT_ENGINES (default: IMPORT_ENGINE).
+    A job with a checkpoint resumes on the engine that wrote it, whatever
+    `engine` asks for, since the two checkpoint in different units.
+    Returns (total, processed).
+    """
+    engine = engine or IMPORT_ENGINE
+    if job.checkpoint_batch:
+        # jobs checkpointed before the engine was recorded are row checkpoints
+        resume_engine = job.engine or "rows"
+        if resume_engine != engine:
+            print(f"[IMPORT] Job {job.id}: resuming on the {resume_engine} engine that wrote its checkpoint")
+            engine = resume_engine
+    job.engine = engine
+
+    if engine == "columnar":
+        # pandas is only loaded by processes that run columnar imports
+        from .columnar import import_csv_columnar
+        return import_csv_columnar(db, job, open_source, batch_size)
+
+    batch_size = batch_size or crud.UPSERT_BATCH_ROWS
+    job_id = job.id
+
+    resume_offset = job.checkpoint_offset or 0
+    if resume_offset:
+        total = job.checkpoint_rows or 0
+        processed = job.processed_rows or 0
+        checkpoint_batch = job.checkpoint_batch or 0
+        counts = {
+            "inserted": job.inserted_rows or 0,
+            "updated": job.updated_rows or 0,
+            "unchanged": job.unchanged_rows or 0,
+        }
+    else:
+        total = 0
+        processed = 0
+        checkpoint_batch = 0
+        counts = crud.new_upsert_counts()
+    # the import session owns the job row from here on; hand back the ORM connection
+    db.commit()
+
+    with open_csv_text(open_source()) as text_stream, metrics.import_stage("dedup"):
+        index = build_sku_index(text_stream)
+    print(f"[IMPORT] Job {job_id}: {len(index)} unique skus, dedup index {index.nbytes} bytes")
+
+    batch = []
+    batch_started = time.perf_counter()
+
+    with crud.ImportSession(db.bind, job_id) as session, open_buffered(open_source()) as stream:
+        position = {"offset": 0}
+        reader = csv.DictReader(iter_lines_with_offsets(stream, position, resume_offset))
+        if resume_offset:
+            print(f"[IMPORT] Job {job_id}: resuming at byte {resume_offset}, row {total}")
+
+        for row in reader:
+            total += 1
+            item = normalize_row(row)
+            if item is None:
+                continue
+
+            if index.last(item["sku"].lower()) != total:
+                # a later row in the file overrides this one
+                continue
+            batch.append(item)
+
+            if len(batch) >= batch_size:
+                metrics.IMPORT_STAGE_SECONDS.labels("parse").observe(time.perf_counter() - batch_started)
+                batch_counts = session.upsert(batch)
+                _add_counts(counts, batch_counts)
+                processed += len(batch)
+                checkpoint_batch += 1
+                utils.try_publish_progress(job_id, session.commit(
+                    processed, total, counts, position["offset"], checkpoint_batch, index.nbytes))
+                metrics.observe_batch(len(batch), time.perf_counter() - batch_started, batch_counts)
+                batch = []
+                batch_started = time.perf_counter()
+
+        batch_counts = {}
+        if batch:
+            metrics.IMPORT_STAGE_SECONDS.labels("parse").observe(time.perf_counter() - batch_started)
+            batch_counts = session.upsert(batch)
+            _add_counts(counts, batch_counts)
+            processed += len(batch)
+            checkpoint_batch += 1
+        session.commit(processed, total, counts, position["offset"], checkpoint_batch, index.nbytes)
+        if batch:
+            metrics.observe_batch(len(batch), time.perf_counter() - batch_started, batch_counts)
+
+    return total, processed
+
+
+def _add_counts(counts: dict, batch_counts: dict):
+    for key, value in batch_counts.items():
+        counts[key] += value
+
+
+def set_job_counts(job: models.ImportJob, counts: dict):
+    job.inserted_rows = counts["inserted"]
+    job.updated_rows = counts["updated"]
+    job.unchanged_rows = counts["unchanged"]
+
+
+def stage_csv_range(db: Session, job_id: int, part: int, text_stream,
+                    fieldnames: List[str], batch_size: int = None) -> int:
+    """
+    Parse one byte range of a CSV (no header line) into import_staging,
+    bumping the job counters after every staged batch. Returns rows read.
+    """
+    batch_size = batch_size or crud.UPSERT_BATCH_ROWS
+    reader = csv.DictReader(text_stream, fieldnames=fieldnames)
+
+    total = 0
+    staged = 0
+    batch_total = 0
+    batch = []
+
+    for row in reader:
+        total += 1
+        batch_total += 1
+        item = normalize_row(row)
+        if item is None:
+            continue
+        batch.append(item)
+
+        if len(batch) >= batch_size:
+            with metrics.import_stage("stage"):
+                crud.stage_products_bulk(db, job_id, part, batch, start_ord=staged)
+            staged += len(batch)
+            _bump_job_progress(db, job_id, len(batch), batch_total)
+            batch = []
+            batch_total = 0
+
+    if batch:
+        with metrics.import_stage("stage"):
+            crud.stage_products_bulk(db, job_id, part, batch, start_ord=staged)
+    if batch_total:
+        _bump_job_progress(db, job_id, len(batch), batch_total)
+
+    return total
+
+
+def _bump_job_progress(db: Session, job_id: int, processed: int, total: int):
+    stmt = (
+        update(models.ImportJob)
+        .where(models.ImportJob.id == job_id)
+        .values(processed_rows=models.ImportJob.processed_rows + processed,
+                total_rows=models.ImportJob.total_rows + total)
+        .returning(models.ImportJob.status, models.ImportJob.processed_rows,
+                   models.ImportJob.total_rows, models.ImportJob.error)
+    )
+    status, processed_rows, total_rows, error = db.execute(stmt).one()
+    db.commit()
+    utils.try_publish_progress(job_id, {
+        "status": status,
+        "processed": processed_rows,
+        "total": total_rows,
+        "error": error,
+    })
+
+
+class IterStream(io.RawIOBase):
+    """Expose an iterator of byte strings as a readable raw stream."""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self._buf = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not len(self._buf):
+            try:
+                self._buf = memoryview(next(self._it))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self):
+        # let a generator source release what it holds (e.g. a server-side cursor)
+        close = getattr(self._it, "close", None)
+        if close is not None:
+            close()
+        super().close()
+
+
+def temp_file_layout(db: Session, filename: str) -> List[Tuple[int, int, int]]:
+    """Return (chunk_index, offset, size) for every stored chunk of a file."""
+    rows = (
+        db.query(models.TempFile.chunk_index, func.octet_length(models.TempFile.chunk_data))
+        .filter(models.TempFile.filename == filename)
+        .order_by(models.TempFile.chunk_index)
+        .all()
+    )
+    layout = []
+    offset = 0
+    for chunk_index, size in rows:
+        layout.append((chunk_index, offset, size))
+        offset += size
+    return layout
+
+
+def iter_temp_file_bytes(db: Session, filename: str, layout, start: int = 0, end: int = None):
+    """Yield the bytes of [start, end) of a stored file, fetching one chunk at a time."""
+    for chunk_index, offset, size in layout:
+        if offset + size <= start:
+            continue
+        if end is not None and offset >= end:
+            break
+        with metrics.import_stage("chunk_fetch"):
+            data = (
+                db.query(models.TempFile.chunk_data)
+                .filter(models.TempFile.filename == filename,
+                        models.TempFile.chunk_index == chunk_index)
+                .scalar()
+            )
+        lo = max(start - offset, 0)
+        hi = size if end is None else min(end - offset, size)
+        yield bytes(data[lo:hi])
+
+
+def iter_temp_file_chunks(filename: str):
+    """
+    Yield the stored chunks of a file in order, one at a time. Every chunk
+    is its own short query on a pooled connection that is handed back
+    before the chunk is consumed, so no transaction stays open for the
+    length of an import and memory does not grow with the file.
+    """
+    last_index = -1
+    while True:
+        with metrics.import_stage("chunk_fetch"), database.engine.connect() as conn:
+            row = conn.execute(
+                select(models.TempFile.chunk_index, models.TempFile.chunk_data)
+                .where(models.TempFile.filename == filename,
+                       models.TempFile.chunk_index > last_index)
+                .order_by(models.TempFile.chunk_index)
+                .limit(1)
+            ).first()
+        if row is None:
+            return
+        last_index = row.chunk_index
+        yield row.chunk_data
+
+
+def find_record_boundaries(chunks, targets: List[int]) -> List[int]:
+    """
+    For each target byte offset, find the offset just past the first newline
+    at or after it that is not inside a quoted field. Quote parity is carried
+    across the whole stream, so quoted newlines never split a record.
+    """
+    boundaries = []
+    pending = sorted(targets)
+    base = 0
+    in_quotes = False
+
+    for data in chunks:
+        pos = 0
+        while pending:
+            target = pending[0] - base
+            if target >= len(data):
+                break
+            if target > pos:
+                in_quotes ^= bool(data.count(b'"', pos, target) & 1)
+                pos = target
+            nl = data.find(b"\n", pos)
+            if nl == -1:
+                break
+            in_quotes ^= bool(data.count(b'"', pos, nl) & 1)
+            pos = nl + 1
+            if not in_quotes:
+                boundary = base + pos
+                boundaries.append(boundary)
+                while pending and pending[0] < boundary:
+                    pending.pop(0)
+        in_quotes ^= bool(data.count(b'"', pos) & 1)
+        base += len(data)
+        if not pending:
+            break
+
+    return boundaries
+
+
+def plan_csv_ranges(chunks, size: int, parts: int):
+    """
+    Split a CSV of `size` bytes into up to `parts` record-aligned byte ranges.
+    Returns (fieldnames, [(start, end), ...]); ranges exclude the header line.
+    Returns (None, None) for a file whose header line ends in a bare \r, which
+    cannot be split and has to be imported serially.
+    """
+    chunks = iter(chunks)
+    # the header line may run past the first chunk (or several short ones)
+    head = []
+    header_end = None
+    for data in chunks:
+        head.append(data)
+        found = find_record_boundaries(head, [0])
+        if found:
+            header_end = found[0]
+            break
+        if b"\r" in data[:-1]:
+            break
+    header = b"".join(head)
+    header_line = header[:header_end]
+    if b"\r" in header_line.rstrip(b"\r\n"):
+        # CR-only line endings; ranges are only ever cut at \n
+        return None, None
+    if header_end is None:
+        header_end = len(header)
+    fieldnames = next(csv.reader([header_line.decode("utf-8")]), [])
+
+    step = max((size - header_end) // parts, 1)
+    targets = [header_end + step * i for i in range(1, parts)]
+
+    def rest():
+        yield header
+        yield from chunks
+
+    cuts = [b for b in find_record_boundaries(rest(), targets) if header_end < b < size]
+    edges = [header_end] + sorted(set(cuts)) + [size]
+    return fieldnames, [(a, b) for a, b in zip(edges, edges[1:]) if b > a]
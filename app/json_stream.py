@@ -0,0 +1,121 @@
+import codecs
+import json
+import os
+from typing import AsyncIterator, List, Tuple
+
+_WHITESPACE = " \t\r\n"
+# an item (or NDJSON line) still incomplete after this many characters is rejected
+JSON_MAX_ITEM_CHARS = int(os.getenv("JSON_MAX_ITEM_CHARS", str(1024 * 1024)))
+
+
+class JsonItemParser:
+    """
+    Incrementally split a body holding either NDJSON or one JSON array into
+    its items. Feed decoded text as it arrives; each call returns the
+    (value, error) pairs completed so far. A malformed NDJSON line yields an
+    error for that line only; a malformed array cannot be resynchronised
+    and raises ValueError. A malformed array item looks like an incomplete
+    one until more data arrives, so at most `max_item_chars` are buffered
+    before giving up, which keeps memory bounded either way.
+    """
+
+    def __init__(self, max_item_chars: int = JSON_MAX_ITEM_CHARS):
+        self._decoder = json.JSONDecoder()
+        self._max_item_chars = max_item_chars
+        self._buf = ""
+        self._mode = None
+        self._closed = False
+        self._expect_comma = False
+        self._after_comma = False
+
+    def feed(self, text: str, final: bool = False) -> List[Tuple[object, str]]:
+        self._buf += text
+        if self._mode is None:
+            stripped = self._buf.lstrip(_WHITESPACE)
+            if not stripped:
+                self._buf = ""
+                return []
+            self._mode = "array" if stripped[0] == "[" else "ndjson"
+            self._buf = stripped[1:] if self._mode == "array" else stripped
+        items = self._feed_array(final) if self._mode == "array" else self._feed_lines(final)
+        if len(self._buf) > self._max_item_chars:
+            raise ValueError(f"JSON item not complete after {self._max_item_chars} characters; "
+                             f"it is malformed or too large")
+        return items
+
+    def _feed_lines(self, final: bool):
+        items = []
+        pos = 0
+        buf = self._buf
+        while True:
+            nl = buf.find("\n", pos)
+            if nl == -1:
+                if not final:
+                    break
+                nl = len(buf)
+            line = buf[pos:nl].strip()
+            pos = nl + 1
+            if line:
+                try:
+                    items.append((json.loads(line), None))
+                except ValueError as e:
+                    items.append((None, f"Invalid JSON: {e}"))
+            if pos > len(buf):
+                break
+        self._buf = buf[pos:]
+        return items
+
+    def _feed_array(self, final: bool):
+        items = []
+        pos = 0
+        buf = self._buf
+        while not self._closed:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                if self._after_comma:
+                    raise ValueError("Trailing ',' in JSON array")
+                self._closed = True
+                pos += 1
+                break
+            if self._expect_comma:
+                if buf[pos] != ",":
+                    raise ValueError(f"Expected ',' or ']' in JSON array, got {buf[pos]!r}")
+                self._expect_comma = False
+                self._after_comma = True
+                pos += 1
+                continue
+            try:
+                value, end = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                if final:
+                    raise
+                # the value is cut off at the end of what has arrived so far
+                break
+            if end == len(buf) and not final:
+                # a number at the very end may still be growing
+                break
+            items.append((value, None))
+            self._expect_comma = True
+            self._after_comma = False
+            pos = end
+        self._buf = buf[pos:]
+        if final:
+            if not self._closed:
+                raise ValueError("Unterminated JSON array")
+            if self._buf.strip(_WHITESPACE):
+                raise ValueError("Unexpected data after JSON array")
+        return items
+
+
+async def iter_json_items(chunks: AsyncIterator[bytes]):
+    """Yield (value, error) for every item of a streamed NDJSON or JSON array body."""
+    parser = JsonItemParser()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        for item in parser.feed(utf8.decode(chunk)):
+            yield item
+    for item in parser.feed(utf8.decode(b"", final=True), final=True):
+        yield item
@@ -1,10 +1,11 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import upload, events, products, webhooks
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from .database import engine, Base
-from . import models
+from . import models, metrics
+import time
 
 Base.metadata.create_all(bind=engine)
 app = FastAPI(title="Product Importer API")
@@ -17,6 +18,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        metrics.HTTP_REQUEST_SECONDS.labels(
+            request.method, getattr(route, "path", "unmatched"), str(status)
+        ).observe(time.perf_counter() - start)
+
 app.include_router(upload.router)
 app.include_router(events.router)
 app.include_router(products.router)
@@ -28,6 +44,11 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 def root():
     return FileResponse("app/static/index.html")
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    body, content_type = metrics.render_latest()
+    return Response(body, media_type=content_type)
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
@@ -0,0 +1,159 @@
+import glob
+import os
+import threading
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess, start_http_server,
+)
+
+# Set in processes that fork workers (Celery prefork) so children's samples are aggregated
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT", "9808"))
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response starts",
+    ["method", "route", "status"], buckets=FAST_BUCKETS,
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled database connection",
+    ["pool"], buckets=FAST_BUCKETS,
+)
+
+IMPORT_STAGE_SECONDS = Histogram(
+    "import_stage_duration_seconds",
+    "Time per import stage: chunk_fetch, dedup, parse, encode (SQL/COPY build), copy and merge "
+    "(database round trips), stage and commit",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+IMPORT_BATCH_SECONDS = Histogram(
+    "import_batch_duration_seconds", "Latency of one import batch, from its first parsed row to its commit",
+    buckets=STAGE_BUCKETS,
+)
+IMPORT_ROWS_PER_SECOND = Gauge(
+    "import_rows_per_second", "Throughput of the most recent import batch",
+    multiprocess_mode="mostrecent",
+)
+IMPORT_ROWS_TOTAL = Counter("import_rows_total", "Imported rows by upsert outcome", ["outcome"])
+IMPORT_JOBS_TOTAL = Counter("import_jobs_total", "Finished import jobs", ["mode", "status"])
+IMPORT_JOB_SECONDS = Histogram(
+    "import_job_duration_seconds", "Wall time of an import job run", ["mode"], buckets=JOB_BUCKETS,
+)
+
+UPLOAD_CHUNK_BYTES = Counter("upload_chunk_bytes_total", "Bytes received in upload chunks")
+UPLOAD_CHUNK_SECONDS = Histogram(
+    "upload_chunk_duration_seconds", "Time to receive and store one upload chunk", buckets=STAGE_BUCKETS,
+)
+
+TASK_QUEUE_WAIT_SECONDS = Histogram(
+    "celery_task_queue_wait_seconds", "Time between publishing a task and a worker starting it",
+    ["task"], buckets=STAGE_BUCKETS + (600, 1800, 3600),
+)
+TASK_RUN_SECONDS = Histogram(
+    "celery_task_run_seconds", "Celery task run time", ["task", "state"], buckets=STAGE_BUCKETS + JOB_BUCKETS[-4:],
+)
+
+PRODUCT_CACHE_REQUESTS_TOTAL = Counter(
+    "product_cache_requests_total", "Product read cache lookups by cache (product, sku, list, count) and result",
+    ["cache", "result"],
+)
+
+WEBHOOK_DELIVERIES_TOTAL = Counter("webhook_deliveries_total", "Webhook delivery attempts by outcome", ["outcome"])
+WEBHOOK_DELIVERY_SECONDS = Histogram(
+    "webhook_delivery_duration_seconds", "Latency of one webhook POST", buckets=FAST_BUCKETS,
+)
+
+
+def import_stage(stage: str):
+    """Context manager timing one import stage."""
+    return IMPORT_STAGE_SECONDS.labels(stage).time()
+
+
+def observe_batch(rows: int, seconds: float, counts: dict = None):
+    IMPORT_BATCH_SECONDS.observe(seconds)
+    if seconds > 0:
+        IMPORT_ROWS_PER_SECOND.set(rows / seconds)
+    for outcome, n in (counts or {}).items():
+        IMPORT_ROWS_TOTAL.labels(outcome).inc(n)
+
+
+def timed_pool_class(base, name: str):
+    """Subclass a SQLAlchemy pool class so every checkout records its wait time."""
+
+    class TimedPool(base):
+        def _do_get(self):
+            with DB_POOL_CHECKOUT_SECONDS.labels(name).time():
+                return super()._do_get()
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def collector_registry():
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_latest():
+    """(body, content type) of the current metrics for a /metrics response."""
+    return generate_latest(collector_registry()), CONTENT_TYPE_LATEST
+
+
+_task_started = {}
+_task_started_lock = threading.Lock()
+
+
+def install_celery_metrics():
+    """
+    Record queue wait and run time of every task and serve /metrics from the
+    worker's main process. Publishers stamp each message with its publish time.
+    """
+    from celery.signals import (
+        before_task_publish, task_prerun, task_postrun, worker_init, worker_ready, worker_process_shutdown,
+    )
+
+    @worker_init.connect(weak=False)
+    def clear_stale_samples(**kwargs):
+        # runs in the main process before any child is forked
+        if PROMETHEUS_MULTIPROC_DIR:
+            for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+                os.remove(path)
+
+    @before_task_publish.connect(weak=False)
+    def stamp_published_at(headers=None, **kwargs):
+        if headers is not None:
+            headers.setdefault("published_at", time.time())
+
+    @task_prerun.connect(weak=False)
+    def observe_queue_wait(task_id=None, task=None, **kwargs):
+        published_at = getattr(task.request, "published_at", None)
+        if published_at:
+            TASK_QUEUE_WAIT_SECONDS.labels(task.name).observe(max(time.time() - published_at, 0))
+        with _task_started_lock:
+            _task_started[task_id] = time.perf_counter()
+
+    @task_postrun.connect(weak=False)
+    def observe_run_time(task_id=None, task=None, state=None, **kwargs):
+        with _task_started_lock:
+            started = _task_started.pop(task_id, None)
+        if started is not None:
+            TASK_RUN_SECONDS.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - started)
+
+    @worker_ready.connect(weak=False)
+    def serve_metrics(**kwargs):
+        start_http_server(CELERY_METRICS_PORT, registry=collector_registry())
+        print(f"[METRICS] Serving worker metrics on :{CELERY_METRICS_PORT}/metrics")
+
+    @worker_process_shutdown.connect(weak=False)
+    def mark_child_dead(pid=None, **kwargs):
+        if PROMETHEUS_MULTIPROC_DIR:
+            multiprocess.mark_process_dead(pid or os.getpid())
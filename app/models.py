@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, Text, DateTime, LargeBinary
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, Text, DateTime, LargeBinary
 from sqlalchemy.sql import expression
 from sqlalchemy.sql import func
 from .database import Base
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy import Computed, DDL, event, null
+from sqlalchemy.orm import deferred
 import datetime
 from sqlalchemy import UniqueConstraint
 
@@ -10,10 +12,29 @@ class ImportJob(Base):
     __tablename__ = "import_jobs"
     
     id = Column(Integer, primary_key=True, index=True)
+    # "import" or "delete"; bulk deletes report progress through the same rows
+    kind = Column(String(20), nullable=False, default="import", server_default="import")
     status = Column(String(50), default="pending")
     total_rows = Column(Integer, default=0)
     processed_rows = Column(Integer, default=0)
+    inserted_rows = Column(Integer, default=0)
+    updated_rows = Column(Integer, default=0)
+    unchanged_rows = Column(Integer, default=0)
+    dedup_bytes = Column(BigInteger, nullable=True)
+    # where the source data lives ("chunks:<dir>" or "temp_files:<filename>"), kept until completion
+    source = Column(String(512), nullable=True)
+    # end of the last committed batch, so a redelivered or retried job can resume
+    checkpoint_offset = Column(BigInteger, nullable=True)
+    checkpoint_rows = Column(Integer, nullable=True)
+    checkpoint_batch = Column(Integer, nullable=True)
+    # engine that wrote the checkpoint ("rows" or "columnar"); resumes go through it
+    engine = Column(String(20), nullable=True)
+    # task id of the finalize step of a parallel import's chord, set before the fan-out
+    chord_id = Column(String(64), nullable=True)
     error = Column(Text, nullable=True)
+    # opt-in cProfile capture (marshalled pstats) and its top-N summary
+    profile_data = deferred(Column(LargeBinary, nullable=True))
+    profile_summary = deferred(Column(Text, nullable=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -26,6 +47,27 @@ class TempFile(Base):
     chunk_data = Column(LargeBinary, nullable=False)  # Stores file chunks
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class ImportStaging(Base):
+    """Unlogged landing table for ranges of a parallel import, merged once at the end"""
+    __tablename__ = "import_staging"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    id = Column(BigInteger, primary_key=True)
+    job_id = Column(Integer, nullable=False, index=True)
+    part = Column(Integer, nullable=False)
+    ord = Column(Integer, nullable=False)
+    sku = Column(String(255), nullable=False)
+    name = Column(String(512), nullable=False)
+    description = Column(Text, nullable=True)
+    price = Column(Text, nullable=True)
+    active = Column(Boolean, nullable=True)
+
+PRODUCT_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(sku, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
 class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, index=True)
@@ -34,8 +76,12 @@ class Product(Base):
     description = Column(Text, nullable=True)
     price = Column(String(64), nullable=True)
     active = Column(Boolean, nullable=False, default=True)
+    # set by the bulk upsert; cleared by ORM writes so the next import rewrites the row
+    content_hash = Column(String(32), nullable=True, onupdate=null())
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now(), server_default=func.now())
+    # maintained by Postgres on every insert/upsert; deferred so listings never load it
+    search_vector = deferred(Column(TSVECTOR, Computed(PRODUCT_SEARCH_VECTOR_SQL, persisted=True)))
 
     __table_args__ = (
         
@@ -43,6 +89,15 @@ class Product(Base):
 
 from sqlalchemy import Index
 Index('ux_products_lower_sku', func.lower(Product.sku), unique=True)
+Index('ix_products_search_vector', Product.search_vector, postgresql_using='gin')
+Index('ix_products_sku_trgm', Product.sku, postgresql_using='gin', postgresql_ops={'sku': 'gin_trgm_ops'})
+Index('ix_products_name_trgm', Product.name, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+Index('ix_products_description_trgm', Product.description, postgresql_using='gin',
+      postgresql_ops={'description': 'gin_trgm_ops'})
+Index('ix_temp_files_filename_chunk_index', TempFile.filename, TempFile.chunk_index)
+
+# trigram indexes need the extension before create_all builds them
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
 
 class Webhook(Base):
     __tablename__ = "webhooks"
@@ -50,3 +105,43 @@ class Webhook(Base):
     url = Column(String(2048), nullable=False)
     event_type = Column(String(128), nullable=False)
     enabled = Column(Boolean, default=True)
+
+
+class WebhookDelivery(Base):
+    """Durable queue of pending webhook deliveries, deleted once delivered"""
+    __tablename__ = "webhook_deliveries"
+    id = Column(BigInteger, primary_key=True)
+    webhook_id = Column(Integer, nullable=False, index=True)
+    url = Column(String(2048), nullable=False)
+    event_type = Column(String(128), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+    last_error = Column(Text, nullable=True)
+    last_status_code = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class WebhookDeadLetter(Base):
+    """Deliveries that failed permanently or ran out of retries"""
+    __tablename__ = "webhook_dead_letters"
+    id = Column(BigInteger, primary_key=True)
+    delivery_id = Column(BigInteger, nullable=False)
+    webhook_id = Column(Integer, nullable=False, index=True)
+    url = Column(String(2048), nullable=False)
+    event_type = Column(String(128), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(Text, nullable=True)
+    last_status_code = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    failed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ProductOutbox(Base):
+    """Product change events written by bulk upserts, drained into batched webhooks"""
+    __tablename__ = "product_outbox"
+    id = Column(BigInteger, primary_key=True)
+    event_type = Column(String(64), nullable=False)
+    product_id = Column(Integer, nullable=False)
+    sku = Column(String(255), nullable=False)
+    job_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,71 @@
+import os
+from collections import OrderedDict
+from sqlalchemy import text
+from .database import SessionLocal
+from . import webhook_delivery, webhook_registry
+
+OUTBOX_SKUS_PER_DELIVERY = int(os.getenv("OUTBOX_SKUS_PER_DELIVERY", "1000"))
+OUTBOX_DRAIN_BATCH_ROWS = int(os.getenv("OUTBOX_DRAIN_BATCH_ROWS", "50000"))
+
+CLAIM_OUTBOX_SQL = text("""
+DELETE FROM product_outbox
+ WHERE id IN (
+    SELECT id FROM product_outbox
+     ORDER BY id
+     LIMIT :limit
+     FOR UPDATE SKIP LOCKED
+ )
+RETURNING id, event_type, product_id, sku, job_id
+""")
+
+
+def coalesce_events(rows):
+    """
+    Group outbox rows by event type, keeping one entry per product (its
+    latest sku) and the set of jobs that produced them.
+    """
+    grouped = OrderedDict()
+    for row in sorted(rows, key=lambda r: r["id"]):
+        products, job_ids = grouped.setdefault(row["event_type"], (OrderedDict(), set()))
+        products[row["product_id"]] = row["sku"]
+        if row["job_id"] is not None:
+            job_ids.add(row["job_id"])
+    return grouped
+
+
+def drain_outbox(max_batches: int = 20) -> int:
+    """
+    Move outbox rows into batched webhook deliveries. Claiming the rows and
+    enqueueing their deliveries commit together, so each change is handed
+    off exactly once. Returns the number of deliveries enqueued.
+    """
+    enqueued = 0
+    for _ in range(max_batches):
+        db = SessionLocal()
+        try:
+            rows = db.execute(CLAIM_OUTBOX_SQL, {"limit": OUTBOX_DRAIN_BATCH_ROWS}).mappings().all()
+            if not rows:
+                db.commit()
+                break
+
+            for event_type, (products, job_ids) in coalesce_events(rows).items():
+                subscriptions = webhook_registry.registry.get(event_type)
+                if not subscriptions:
+                    continue
+                items = [{"id": pid, "sku": sku} for pid, sku in products.items()]
+                for start in range(0, len(items), OUTBOX_SKUS_PER_DELIVERY):
+                    page = items[start:start + OUTBOX_SKUS_PER_DELIVERY]
+                    payload = {
+                        "event": event_type,
+                        "count": len(page),
+                        "products": page,
+                        "job_ids": sorted(job_ids),
+                    }
+                    enqueued += webhook_delivery.enqueue_deliveries(db, subscriptions, event_type, payload)
+            db.commit()
+        finally:
+            db.close()
+
+        if len(rows) < OUTBOX_DRAIN_BATCH_ROWS:
+            break
+    return enqueued
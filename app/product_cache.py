@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+from typing import Optional, Tuple
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from . import metrics, utils
+
+PRODUCT_CACHE_ENABLED = os.getenv("PRODUCT_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+PRODUCT_CACHE_TTL_SECONDS = int(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "300"))
+LIST_CACHE_TTL_SECONDS = int(os.getenv("LIST_CACHE_TTL_SECONDS", "60"))
+
+KEY_PREFIX = "catalog:"
+GENERATION_KEY = KEY_PREFIX + "generation"
+
+redis_async = aioredis.Redis.from_url(utils.REDIS_URL)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+def product_key(product_id: int) -> str:
+    return f"{KEY_PREFIX}product:id:{product_id}"
+
+
+def sku_key(sku: str) -> str:
+    return f"{KEY_PREFIX}product:sku:{_digest(sku.strip().lower())}"
+
+
+def query_key(kind: str, params: dict) -> str:
+    """Key of a list page or count; unset and empty parameters do not filter, so they are dropped"""
+    normalized = json.dumps(
+        {k: v for k, v in params.items() if v is not None and v != ""},
+        sort_keys=True, separators=(",", ":"),
+    )
+    return f"{KEY_PREFIX}{kind}:{_digest(normalized)}"
+
+
+async def lookup(key: str, cache: str) -> Tuple[Optional[bytes], Optional[int]]:
+    """
+    Return (cached body or None, current catalog generation). Entries are
+    stamped with the generation they were read under and only served while
+    it is still current, so any bump invalidates every entry at once.
+    Pass the generation on to store() after a miss; it is read before the
+    database, so a fill that raced a write is never served.
+    """
+    if not PRODUCT_CACHE_ENABLED:
+        return None, None
+    try:
+        generation, value = await redis_async.mget(GENERATION_KEY, key)
+    except RedisError as e:
+        print(f"[WARN] Product cache lookup failed: {e}")
+        return None, None
+    generation = int(generation or 0)
+    if value is not None:
+        stamp, _, body = value.partition(b":")
+        if int(stamp) == generation:
+            metrics.PRODUCT_CACHE_REQUESTS_TOTAL.labels(cache, "hit").inc()
+            return body, generation
+    metrics.PRODUCT_CACHE_REQUESTS_TOTAL.labels(cache, "miss").inc()
+    return None, generation
+
+
+async def store(key: str, generation: Optional[int], body: bytes, ttl: int):
+    if generation is None:
+        return
+    try:
+        await redis_async.set(key, b"%d:%s" % (generation, body), ex=ttl)
+    except RedisError as e:
+        print(f"[WARN] Product cache store failed: {e}")
+
+
+def bump_generation():
+    """
+    Invalidate every cached product, page and count; call after committing
+    any catalog write. If Redis is unreachable, entries expire by TTL instead.
+    """
+    try:
+        utils.redis_cli.incr(GENERATION_KEY)
+    except RedisError as e:
+        print(f"[WARN] Product cache invalidation failed: {e}")
@@ -0,0 +1,61 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+from typing import Optional
+from .database import SessionLocal
+from . import models
+
+# Profile every import when set; a job can also opt in on its own
+IMPORT_PROFILE = os.getenv("IMPORT_PROFILE", "").lower() in ("1", "true", "yes")
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+
+
+def profiling_enabled(requested: Optional[bool]) -> bool:
+    return IMPORT_PROFILE if requested is None else bool(requested)
+
+
+def start(enabled: bool) -> Optional[cProfile.Profile]:
+    """Start a deterministic profiler for the current thread, or return None (and cost nothing) when off."""
+    if not enabled:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def summarize(profiler: cProfile.Profile, top_n: int = PROFILE_TOP_N) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out).strip_dirs()
+    out.write(f"Top {top_n} functions by cumulative time\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top_n)
+    out.write(f"Top {top_n} functions by own time\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(top_n)
+    return out.getvalue()
+
+
+def finish(job_id: int, profiler: Optional[cProfile.Profile]):
+    """
+    Stop the profiler and store the raw pstats dump (loadable with
+    pstats.Stats or snakeviz) and a top-N summary on the job.
+    """
+    if profiler is None:
+        return
+    profiler.create_stats()
+    data = marshal.dumps(profiler.stats)
+    summary = summarize(profiler)
+
+    db = SessionLocal()
+    try:
+        job = db.query(models.ImportJob).get(job_id)
+        if job:
+            job.profile_data = data
+            job.profile_summary = summary
+            db.commit()
+            print(f"[PROFILE] Job {job_id}: stored {len(data)} byte profile")
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] Could not store profile for job {job_id}: {e}")
+    finally:
+        db.close()
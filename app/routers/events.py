@@ -1,41 +1,117 @@
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-import json, asyncio
-from app.database import SessionLocal
+from collections import defaultdict
+from redis import asyncio as aioredis
+import json, asyncio, os
+from app.database import AsyncSessionLocal
 from app.models import ImportJob
+from app.utils import REDIS_URL, PROGRESS_CHANNEL_PREFIX, job_progress_payload
+
+router = APIRouter()
+
+# How long an SSE stream waits for a pushed update before re-reading the job
+FALLBACK_POLL_SECONDS = float(os.getenv("SSE_FALLBACK_POLL_SECONDS", "15"))
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class ProgressHub:
+    """
+    Holds a single Redis pattern subscription per process and fans every
+    progress message out to the local SSE listeners of that job.
+    """
+
+    def __init__(self, url: str):
+        self._url = url
+        self._listeners = defaultdict(set)
+        self._task = None
+
+    def subscribe(self, job_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=16)
+        self._listeners[job_id].add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, job_id: int, queue: asyncio.Queue):
+        listeners = self._listeners.get(job_id)
+        if listeners is None:
+            return
+        listeners.discard(queue)
+        if not listeners:
+            del self._listeners[job_id]
+
+    def _dispatch(self, job_id: int, payload: dict):
+        for queue in list(self._listeners.get(job_id, ())):
+            # progress messages are snapshots, so a slow reader only needs the latest
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    async def _run(self):
+        while True:
+            client = aioredis.Redis.from_url(self._url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{PROGRESS_CHANNEL_PREFIX}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    try:
+                        job_id = int(channel[len(PROGRESS_CHANNEL_PREFIX):])
+                        payload = json.loads(message["data"])
+                    except ValueError:
+                        continue
+                    self._dispatch(job_id, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARN] Progress subscription lost, retrying: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+                await client.close()
+
+
+hub = ProgressHub(REDIS_URL)
+
+
+async def load_job_payload(job_id: int):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(ImportJob, job_id)
+        return job_progress_payload(job) if job else None
 
-router = APIRouter()  
 
 @router.get("/events/import/{job_id}")
 async def import_events(job_id: int):
 
     async def event_stream():
-        while True:
-            db = SessionLocal()
-            job = db.query(ImportJob).get(job_id)
-            db.close()
-
-            if not job:
-                # Send error event
-                yield "data: " + json.dumps({
-                    "status": "failed",
-                    "error": "Job not found"
-                }) + "\n\n"
-                break
-
-            payload = {
-                "status": job.status,
-                "processed": job.processed_rows,
-                "total": job.total_rows,
-                "error": job.error,
-            }
-
-            yield f"data: {json.dumps(payload)}\n\n"
-
-            if job.status in ("completed", "failed"):
-                break
-
-            await asyncio.sleep(1)
+        # subscribe before the snapshot so no update can slip in between
+        queue = hub.subscribe(job_id)
+        try:
+            payload = await load_job_payload(job_id)
+            while True:
+                if payload is None:
+                    # Send error event
+                    yield "data: " + json.dumps({
+                        "status": "failed",
+                        "error": "Job not found"
+                    }) + "\n\n"
+                    break
+
+                yield f"data: {json.dumps(payload)}\n\n"
+
+                if payload.get("status") in TERMINAL_STATUSES:
+                    break
+
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=FALLBACK_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    payload = await load_job_payload(job_id)
+        finally:
+            hub.unsubscribe(job_id, queue)
 
     return StreamingResponse(
         event_stream(),
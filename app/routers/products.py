@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from typing import List, Optional
-from ..database import SessionLocal
-from .. import models, schemas, crud
+from uuid import uuid4
+import os
+from ..database import SessionLocal, get_async_db
+from .. import models, schemas, crud, export, bulk_delete, json_stream, product_cache, webhook_registry
+from .upload import save_stream, iter_upload_file
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from pydantic import ValidationError
+from sqlalchemy import func, select
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+BULK_BATCH_ITEMS = int(os.getenv("BULK_BATCH_ITEMS", "5000"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000000"))
+BULK_MAX_SKU_LENGTH = 255
+LIST_MAX_LIMIT = int(os.getenv("LIST_MAX_LIMIT", "5000"))
+
 def get_db():
     db = SessionLocal()
     try:
@@ -15,30 +27,98 @@ def get_db():
     finally:
         db.close()
 
+def notify_webhooks(event_type: str, product_id: int):
+    """Enqueue one batched delivery task for every cached subscriber of an event"""
+    subscriptions = webhook_registry.registry.get(event_type)
+    if not subscriptions:
+        return
+    from ..tasks import deliver_webhook_event
+    deliver_webhook_event.delay(
+        event_type,
+        {"event": event_type, "product_id": product_id},
+        [list(s) for s in subscriptions],
+    )
+
 @router.get("/")
-def list_products(
-    limit: int = 20,
-    page: int = 1,
+async def list_products(
+    limit: int = Query(20, ge=1, le=LIST_MAX_LIMIT),
+    page: int = Query(1, ge=1),
+    after: str = Query(None),
     sku: str = Query(None),
     name: str = Query(None),
     description: str = Query(None),
     active: bool = Query(None),
-    db: Session = Depends(get_db)
+    fields: str = Query(None, description="Comma-separated columns to return, e.g. id,sku,name"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.Product)
+    filters = {"sku": sku, "name": name, "description": description, "active": active}
+    try:
+        columns = crud.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    key = product_cache.query_key("list", dict(filters, limit=limit, page=None if after else page, after=after,
+                                               fields=",".join(columns)))
+    body, generation = await product_cache.lookup(key, "list")
+    if body is not None:
+        return Response(body, media_type="application/json")
+
+    try:
+        stmt = crud.product_page_stmt(filters, limit, after=after, offset=(page - 1) * limit, fields=columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows, next_cursor = crud.split_page((await db.execute(stmt)).all(), limit)
+    # plain tuples straight to dicts; a trailing id selected only for the cursor is dropped by zip
+    items = [dict(zip(columns, row)) for row in rows]
+
+    if after:
+        # keyset pages skip the count so deep pages cost the same as the first
+        payload = {"items": items, "total": None, "page": None, "limit": limit, "next_cursor": next_cursor}
+    else:
+        # every page of a filter shares one cached count
+        count_key = product_cache.query_key("count", filters)
+        cached_total, _ = await product_cache.lookup(count_key, "count")
+        if cached_total is not None:
+            total = int(cached_total)
+        else:
+            total = (await db.execute(crud.product_count_stmt(filters))).scalar()
+            await product_cache.store(count_key, generation, str(total).encode(), product_cache.LIST_CACHE_TTL_SECONDS)
+        payload = {"items": items, "total": total, "page": page, "limit": limit, "next_cursor": next_cursor}
 
-    if sku:
-        query = query.filter(models.Product.sku.ilike(f"%{sku}%"))
-    if name:
-        query = query.filter(models.Product.name.ilike(f"%{name}%"))
-    if description:
-        query = query.filter(models.Product.description.ilike(f"%{description}%"))
-    if active is not None:
-        query = query.filter(models.Product.active == active)
+    response = ORJSONResponse(payload)
+    await product_cache.store(key, generation, response.body, product_cache.LIST_CACHE_TTL_SECONDS)
+    return response
 
-    total = query.count()
-    items = query.offset((page - 1) * limit).limit(limit).all()
-    return {"items": items, "total": total, "page": page, "limit": limit}
+@router.get("/search")
+def search_products(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    active: bool = Query(None),
+    db: Session = Depends(get_db)
+):
+    items = crud.search_products(db, q, limit=limit, active=active)
+    return {"items": items, "q": q}
+
+@router.get("/export")
+def export_products(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    sku: str = Query(None),
+    name: str = Query(None),
+    description: str = Query(None),
+    active: bool = Query(None),
+):
+    """Stream the filtered catalog as CSV or NDJSON straight from Postgres"""
+    filters = {"sku": sku, "name": name, "description": description, "active": active}
+    filename = f"products.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        export.stream_products(format, filters, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.post("/", response_model=schemas.ProductRead)
 def create_product(p: schemas.ProductCreate, db: Session = Depends(get_db)):
@@ -55,18 +135,112 @@ def create_product(p: schemas.ProductCreate, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=400, detail="SKU already exists")
     
-    from ..tasks import trigger_webhook
-    webhooks = db.query(models.Webhook).filter(models.Webhook.event_type=="product.created", models.Webhook.enabled==True).all()
-    for wh in webhooks:
-        trigger_webhook.delay(wh.id, product_id=prod.id)
+    product_cache.bump_generation()
+    notify_webhooks("product.created", prod.id)
     return prod
 
+def _bulk_item_row(value) -> dict:
+    """Validate one bulk item into an upsert row, as normalize_row does for CSV rows"""
+    try:
+        p = schemas.ProductCreate.model_validate(value)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in err['loc']) or 'item'}: {err['msg']}" for err in e.errors()
+        ))
+    sku = p.sku.strip()
+    if not sku:
+        raise ValueError("sku: must not be empty")
+    if len(sku) > BULK_MAX_SKU_LENGTH:
+        raise ValueError(f"sku: longer than {BULK_MAX_SKU_LENGTH} characters")
+    return {
+        "sku": sku,
+        "name": p.name.strip()[:512],
+        "description": p.description,
+        "price": p.price,
+        "active": p.active,
+    }
+
+def _upsert_bulk_batch(db: Session, batch: list, results: list, counts: dict):
+    """Upsert one batch of (index, row) pairs, recording an outcome for every item"""
+    outcomes = []
+    batch_counts = crud.create_or_update_products_bulk(db, [row for _, row in batch], results=outcomes)
+    for key, value in batch_counts.items():
+        counts[key] += value
+    by_ord = {ord_: (product_id, status) for ord_, product_id, status in outcomes}
+    for ord_, (index, row) in enumerate(batch):
+        if ord_ in by_ord:
+            product_id, status = by_ord[ord_]
+            results.append({"index": index, "sku": row["sku"], "status": status, "id": product_id})
+        else:
+            counts["skipped"] += 1
+            results.append({"index": index, "sku": row["sku"], "status": "skipped",
+                            "error": "Superseded by a later item with the same sku"})
+
+@router.post("/bulk")
+async def bulk_upsert_products(request: Request, db: Session = Depends(get_db)):
+    """
+    Create or update products from a streamed NDJSON or JSON array body of
+    ProductCreate items, in batches through the bulk upsert engine. Items
+    are matched by sku (case-insensitive); within a batch the last item for
+    a sku wins. Returns counts and one result per item, in request order.
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0, "invalid": 0}
+    results = []
+    batch = []
+    index = 0
+    try:
+        async for value, error in json_stream.iter_json_items(request.stream()):
+            if index >= BULK_MAX_ITEMS:
+                raise HTTPException(413, f"At most {BULK_MAX_ITEMS} items per request")
+            try:
+                if error:
+                    raise ValueError(error)
+                batch.append((index, _bulk_item_row(value)))
+            except ValueError as e:
+                counts["invalid"] += 1
+                results.append({"index": index, "status": "invalid", "error": str(e)})
+            index += 1
+
+            if len(batch) >= BULK_BATCH_ITEMS:
+                await run_in_threadpool(_upsert_bulk_batch, db, batch, results, counts)
+                batch = []
+    except ValueError as e:
+        applied = index - len(batch)
+        raise HTTPException(400, f"Malformed JSON body after item {index}: {e} ({applied} items were already applied)")
+
+    if batch:
+        await run_in_threadpool(_upsert_bulk_batch, db, batch, results, counts)
+
+    results.sort(key=lambda r: r["index"])
+    return JSONResponse({"counts": counts, "items": results})
+
+def _product_json(prod: models.Product) -> bytes:
+    return schemas.ProductRead.model_validate(prod, from_attributes=True).model_dump_json().encode()
+
+@router.get("/sku/{sku}", response_model=schemas.ProductRead)
+async def get_product_by_sku(sku: str, db: AsyncSession = Depends(get_async_db)):
+    key = product_cache.sku_key(sku)
+    body, generation = await product_cache.lookup(key, "sku")
+    if body is None:
+        stmt = select(models.Product).where(func.lower(models.Product.sku) == sku.strip().lower())
+        prod = (await db.execute(stmt)).scalars().first()
+        if not prod:
+            raise HTTPException(404, "Not found")
+        body = _product_json(prod)
+        await product_cache.store(key, generation, body, product_cache.PRODUCT_CACHE_TTL_SECONDS)
+    return Response(body, media_type="application/json")
+
 @router.get("/{product_id}", response_model=schemas.ProductRead)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    prod = db.query(models.Product).get(product_id)
-    if not prod:
-        raise HTTPException(404, "Not found")
-    return prod
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    key = product_cache.product_key(product_id)
+    body, generation = await product_cache.lookup(key, "product")
+    if body is None:
+        prod = await db.get(models.Product, product_id)
+        if not prod:
+            raise HTTPException(404, "Not found")
+        body = _product_json(prod)
+        await product_cache.store(key, generation, body, product_cache.PRODUCT_CACHE_TTL_SECONDS)
+    return Response(body, media_type="application/json")
 
 @router.put("/{product_id}", response_model=schemas.ProductRead)
 def update_product(product_id: int, p: schemas.ProductCreate, db: Session = Depends(get_db)):
@@ -91,10 +265,8 @@ def update_product(product_id: int, p: schemas.ProductCreate, db: Session = Depe
         db.rollback()
         raise HTTPException(status_code=400, detail="SKU already exists")
 
-    from ..tasks import trigger_webhook
-    webhooks = db.query(models.Webhook).filter(models.Webhook.event_type=="product.updated", models.Webhook.enabled==True).all()
-    for wh in webhooks:
-        trigger_webhook.delay(wh.id, product_id=prod.id)
+    product_cache.bump_generation()
+    notify_webhooks("product.updated", prod.id)
     return prod
 
 @router.delete("/{product_id}")
@@ -104,16 +276,34 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(404, "Not found")
     db.delete(prod)
     db.commit()
-    from ..tasks import trigger_webhook
-    webhooks = db.query(models.Webhook).filter(models.Webhook.event_type=="product.deleted", models.Webhook.enabled==True).all()
-    for wh in webhooks:
-        trigger_webhook.delay(wh.id, product_id=product_id)
+    product_cache.bump_generation()
+    notify_webhooks("product.deleted", product_id)
     return {"status":"deleted"}
 
 @router.delete("/")
-def bulk_delete_all(confirm: bool = Query(False), db: Session = Depends(get_db)):
+def bulk_delete_all(
+    background_tasks: BackgroundTasks,
+    confirm: bool = Query(False),
+    sku: str = Query(None),
+    name: str = Query(None),
+    description: str = Query(None),
+    active: bool = Query(None),
+):
+    """Start a background delete of every product matching the filters (all of them without any)"""
+    filters = {"sku": sku, "name": name, "description": description, "active": active}
     if not confirm:
-        raise HTTPException(400, "Pass confirm=true to actually delete all products")
-    deleted = db.query(models.Product).delete()
-    db.commit()
-    return {"deleted": deleted}
+        target = "the matching products" if bulk_delete.has_filters(filters) else "all products"
+        raise HTTPException(400, f"Pass confirm=true to actually delete {target}")
+    job_id = bulk_delete.create_delete_job()
+    background_tasks.add_task(bulk_delete.run_bulk_delete, job_id, filters)
+    return {"job_id": job_id, "status": "started"}
+
+@router.post("/bulk-delete")
+async def bulk_delete_skus(background_tasks: BackgroundTasks, skus: UploadFile = File(...)):
+    """Start a background delete of the products listed in an uploaded CSV of skus"""
+    os.makedirs(bulk_delete.BULK_DELETE_DIR, exist_ok=True)
+    path = os.path.join(bulk_delete.BULK_DELETE_DIR, f"{uuid4().hex}.csv")
+    await save_stream(iter_upload_file(skus), path)
+    job_id = await run_in_threadpool(bulk_delete.create_delete_job)
+    background_tasks.add_task(bulk_delete.run_bulk_delete, job_id, None, path)
+    return {"job_id": job_id, "status": "started"}
@@ -1,81 +1,120 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form, BackgroundTasks
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, BackgroundTasks, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
 from uuid import uuid4
-import os, csv, io
+from datetime import datetime, timezone
+import os, re, shutil, json, hashlib, time
+import aiofiles
 from ..database import SessionLocal
-from .. import models
-from .. import crud
+from .. import models, schemas
+from .. import importer, metrics, profiling, utils
 import traceback
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
-def process_csv_content(content: bytes, job_id: int):
-    """Process CSV directly from memory"""
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "/tmp/upload_chunks")
+# request bodies are written to disk in pieces of this size, never held whole
+UPLOAD_PIECE_SIZE = int(os.getenv("UPLOAD_PIECE_SIZE", str(1024 * 1024)))
+UPLOAD_DEFAULT_CHUNK_BYTES = int(os.getenv("UPLOAD_DEFAULT_CHUNK_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(64 * 1024 * 1024)))
+SESSION_FILE = "session.json"
+# created exclusively by the one /complete call that gets to start the import
+COMPLETE_LOCK_FILE = "complete.lock"
+# upload directories untouched for this long, and not feeding a running job, are removed
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+DIGEST_DIR = "digests"
+UPLOAD_ID_RE = re.compile(r"[0-9a-f]{32}")
+# a running job that has not reported progress for this long is presumed dead and may be retried
+IMPORT_STALE_SECONDS = int(os.getenv("IMPORT_STALE_SECONDS", "900"))
+# a parallel merge reports nothing until it ends; only presume it dead once the
+# worker's hard task_time_limit has certainly killed it
+IMPORT_MERGE_STALE_SECONDS = int(os.getenv("IMPORT_MERGE_STALE_SECONDS", "7200"))
+
+def process_csv_content(open_source, job_id: int, profile: bool = None, engine: str = None) -> bool:
+    """Process CSV from binary streams returned by open_source(), decoding them incrementally"""
     db = SessionLocal()
+    started = time.perf_counter()
+    profiler = profiling.start(profiling.profiling_enabled(profile))
     try:
         job = db.query(models.ImportJob).get(job_id)
         job.status = "importing"
+        job.error = None
         db.commit()
-        
-        csv_text = content.decode('utf-8')
-        csv_file = io.StringIO(csv_text)
-        reader = csv.DictReader(csv_file)
-        
-        total = 0
-        processed = 0
-        batch = []
-        seen = set()
-        BATCH_SIZE = 5000
-        
-        for row in reader:
-            total += 1
-            sku = row.get("sku")
-            if not sku:
-                continue
-            
-            normalized = sku.strip().lower()
-            if normalized in seen:
-                continue
-            seen.add(normalized)
-            
-            batch.append({
-                "sku": sku.strip(),
-                "name": row.get("name", "").strip()[:512],
-                "description": row.get("description", "")[:2000],
-                "price": row.get("price") if "price" in row else None,
-                "active": True,
-            })
-            
-            if len(batch) >= BATCH_SIZE:
-                crud.create_or_update_products_bulk(db, batch)
-                processed += len(batch)
-                batch = []
-                seen = set()
-                
-                job.processed_rows = processed
-                job.total_rows = total
-                db.commit()
-                db.expire_all()
-        
-        if batch:
-            crud.create_or_update_products_bulk(db, batch)
-            processed += len(batch)
-        
+        utils.publish_job_progress(job)
+
+        total, processed = importer.import_csv(db, job, open_source, engine=engine)
+
         job.status = "completed"
         job.processed_rows = processed
         job.total_rows = total
         db.commit()
+        utils.publish_job_progress(job)
+        metrics.IMPORT_JOB_SECONDS.labels("chunks").observe(time.perf_counter() - started)
+        metrics.IMPORT_JOBS_TOTAL.labels("chunks", "completed").inc()
+        return True
         
     except Exception as e:
+        db.rollback()
+        metrics.IMPORT_JOBS_TOTAL.labels("chunks", "failed").inc()
         job = db.query(models.ImportJob).get(job_id)
         if job:
             job.status = "failed"
             job.error = str(e)
             db.commit()
+            utils.publish_job_progress(job)
         print(f"[ERROR] Processing failed: {str(e)}")
         traceback.print_exc()
+        return False
     finally:
+        profiling.finish(job_id, profiler)
         db.close()
 
+def process_uploaded_chunks(upload_dir: str, job_id: int, profile: bool = None, engine: str = None):
+    """Stream the chunk files of an upload into the importer; keep them until it succeeds"""
+    paths = importer.list_chunk_files(upload_dir)
+    if process_csv_content(lambda: importer.ChunkFileStream(paths), job_id, profile=profile, engine=engine):
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+async def iter_upload_file(upload: UploadFile):
+    while True:
+        piece = await upload.read(UPLOAD_PIECE_SIZE)
+        if not piece:
+            break
+        yield piece
+
+async def save_stream(pieces, path: str, hasher=None, limit: int = None) -> int:
+    """
+    Write an async iterator of byte strings to `path` without blocking the
+    event loop, coalescing small network reads into UPLOAD_PIECE_SIZE writes.
+    The data lands in a temporary file and replaces `path` only when complete.
+    Returns the number of bytes written.
+    """
+    tmp_path = os.path.join(os.path.dirname(path), f".part_{uuid4().hex}")
+    size = 0
+    pending = bytearray()
+    started = time.perf_counter()
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            async for piece in pieces:
+                size += len(piece)
+                if limit is not None and size > limit:
+                    raise HTTPException(status_code=413, detail=f"Chunk exceeds {limit} bytes")
+                if hasher is not None:
+                    hasher.update(piece)
+                pending += piece
+                if len(pending) >= UPLOAD_PIECE_SIZE:
+                    await f.write(pending)
+                    pending = bytearray()
+            if pending:
+                await f.write(pending)
+        os.replace(tmp_path, path)
+        metrics.UPLOAD_CHUNK_SECONDS.observe(time.perf_counter() - started)
+        metrics.UPLOAD_CHUNK_BYTES.inc(size)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return size
+
 @router.post("/chunk")
 async def upload_chunk(
     chunk: UploadFile = File(...),
@@ -86,14 +125,11 @@ async def upload_chunk(
 ):
     """Save chunks to /tmp (not database)"""
     try:
-        upload_dir = f"/tmp/upload_chunks/{uploadId}"
+        upload_dir = f"{UPLOAD_ROOT}/{uploadId}"
         os.makedirs(upload_dir, exist_ok=True)
         
         chunk_path = os.path.join(upload_dir, f"chunk_{chunkIndex}")
-        
-        with open(chunk_path, "wb") as f:
-            content = await chunk.read()
-            f.write(content)
+        await save_stream(iter_upload_file(chunk), chunk_path)
         
         print(f"[CHUNK] Saved {chunkIndex + 1}/{totalChunks}")
         
@@ -103,47 +139,292 @@ async def upload_chunk(
         print(f"[ERROR] Chunk failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def create_chunk_import_job(upload_dir: str) -> int:
+    db = SessionLocal()
+    try:
+        job = models.ImportJob(status="pending", total_rows=0, processed_rows=0,
+                               source=f"chunks:{upload_dir}")
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        return job.id
+    finally:
+        db.close()
+
+def _session_dir(upload_id: str) -> str:
+    if not UPLOAD_ID_RE.fullmatch(upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return os.path.join(UPLOAD_ROOT, upload_id)
+
+async def _load_session(upload_id: str):
+    upload_dir = _session_dir(upload_id)
+    try:
+        async with aiofiles.open(os.path.join(upload_dir, SESSION_FILE)) as f:
+            return upload_dir, json.loads(await f.read())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+async def _save_session(upload_dir: str, session: dict):
+    tmp_path = os.path.join(upload_dir, f".session_{uuid4().hex}")
+    async with aiofiles.open(tmp_path, "w") as f:
+        await f.write(json.dumps(session))
+    os.replace(tmp_path, os.path.join(upload_dir, SESSION_FILE))
+
+def _chunk_length(session: dict, index: int) -> int:
+    if index == session["total_chunks"] - 1:
+        return session["size"] - session["chunk_size"] * index
+    return session["chunk_size"]
+
+def _received_chunks(upload_dir: str):
+    return sorted(int(os.path.basename(p).split("_")[1]) for p in importer.list_chunk_files(upload_dir))
+
+def _file_sha256(upload_dir: str) -> str:
+    hasher = hashlib.sha256()
+    with importer.open_buffered(importer.ChunkFileStream(importer.list_chunk_files(upload_dir))) as stream:
+        for piece in iter(lambda: stream.read(importer.READ_BUFFER_SIZE), b""):
+            hasher.update(piece)
+    return hasher.hexdigest()
+
+def _composite_sha256(upload_dir: str, total_chunks: int) -> str:
+    hasher = hashlib.sha256()
+    for index in range(total_chunks):
+        with open(os.path.join(upload_dir, DIGEST_DIR, str(index))) as f:
+            hasher.update(bytes.fromhex(f.read()))
+    return hasher.hexdigest()
+
+@router.post("/sessions")
+async def create_upload_session(data: schemas.UploadSessionCreate):
+    """Start a resumable upload; chunks may then arrive in any order and in parallel"""
+    chunk_size = data.chunk_size or UPLOAD_DEFAULT_CHUNK_BYTES
+    if chunk_size > UPLOAD_MAX_CHUNK_BYTES:
+        raise HTTPException(status_code=400, detail=f"chunk_size may not exceed {UPLOAD_MAX_CHUNK_BYTES} bytes")
+
+    upload_id = uuid4().hex
+    upload_dir = os.path.join(UPLOAD_ROOT, upload_id)
+    os.makedirs(os.path.join(upload_dir, DIGEST_DIR))
+    session = {
+        "filename": data.filename,
+        "size": data.size,
+        "chunk_size": chunk_size,
+        "total_chunks": -(-data.size // chunk_size),
+        "job_id": None,
+    }
+    await _save_session(upload_dir, session)
+    return {"upload_id": upload_id, **session, "received": []}
+
+@router.get("/sessions/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """Report which chunks have arrived, so an interrupted client only resends the rest"""
+    upload_dir, session = await _load_session(upload_id)
+    received = _received_chunks(upload_dir)
+    return {"upload_id": upload_id, **session, "received": received,
+            "missing": session["total_chunks"] - len(received)}
+
+@router.put("/sessions/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request,
+                           x_chunk_sha256: str = Header(...)):
+    """Store one raw chunk body, verified against its sha256; re-sending a chunk replaces it"""
+    upload_dir, session = await _load_session(upload_id)
+    if session["job_id"] is not None or os.path.exists(os.path.join(upload_dir, COMPLETE_LOCK_FILE)):
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    if not 0 <= index < session["total_chunks"]:
+        raise HTTPException(status_code=404, detail="Chunk index out of range")
+
+    expected = _chunk_length(session, index)
+    hasher = hashlib.sha256()
+    staged_path = os.path.join(upload_dir, f".staged_{index}_{uuid4().hex}")
+    try:
+        size = await save_stream(request.stream(), staged_path, hasher, limit=expected)
+        if size != expected:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes, got {size}")
+        digest = hasher.hexdigest()
+        if digest != x_chunk_sha256.strip().lower():
+            raise HTTPException(status_code=422, detail=f"Checksum mismatch for chunk {index}")
+
+        async with aiofiles.open(os.path.join(upload_dir, DIGEST_DIR, str(index)), "w") as f:
+            await f.write(digest)
+        os.replace(staged_path, os.path.join(upload_dir, f"chunk_{index}"))
+    finally:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
+
+    return {"index": index, "size": size, "sha256": digest}
+
+@router.post("/sessions/{upload_id}/complete")
+async def complete_upload_session(upload_id: str, data: schemas.UploadComplete,
+                                  background_tasks: BackgroundTasks):
+    """Check that every chunk arrived and the file checksum matches, then start the import"""
+    upload_dir, session = await _load_session(upload_id)
+    if session["job_id"] is not None:
+        return {"job_id": session["job_id"], "status": "started"}
+
+    # a retried /complete must not start a second job on the same chunk files
+    lock_path = os.path.join(upload_dir, COMPLETE_LOCK_FILE)
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        upload_dir, session = await _load_session(upload_id)
+        if session["job_id"] is not None:
+            return {"job_id": session["job_id"], "status": "started"}
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+
+    try:
+        received = set(_received_chunks(upload_dir))
+        missing = [i for i in range(session["total_chunks"]) if i not in received]
+        if missing:
+            raise HTTPException(status_code=409, detail={"error": "Upload is incomplete", "missing": missing[:1000]})
+
+        if data.checksum_type == "composite":
+            digest = await run_in_threadpool(_composite_sha256, upload_dir, session["total_chunks"])
+        else:
+            digest = await run_in_threadpool(_file_sha256, upload_dir)
+        if digest != data.sha256.strip().lower():
+            raise HTTPException(status_code=422, detail="File checksum mismatch")
+
+        job_id = await run_in_threadpool(create_chunk_import_job, upload_dir)
+        session["job_id"] = job_id
+        await _save_session(upload_dir, session)
+    except BaseException:
+        # nothing was started; let the client fix the upload and complete again
+        os.remove(lock_path)
+        raise
+
+    background_tasks.add_task(process_uploaded_chunks, upload_dir, job_id, data.profile, data.engine)
+    print(f"[UPLOAD] Session {upload_id} complete, processing started for job {job_id}")
+    return {"job_id": job_id, "status": "started"}
+
+def expire_upload_sessions(max_age: float = UPLOAD_SESSION_TTL_SECONDS) -> int:
+    """
+    Remove upload directories (sessions and legacy /chunk uploads) that have
+    not changed for `max_age` seconds, unless a pending or running job still
+    reads them. Returns the number removed.
+    """
+    if not os.path.isdir(UPLOAD_ROOT):
+        return 0
+    now = time.time()
+    removed = 0
+    db = SessionLocal()
+    try:
+        for entry in os.scandir(UPLOAD_ROOT):
+            if not entry.is_dir():
+                continue
+            last_change = max(
+                [entry.stat().st_mtime]
+                + [os.path.getmtime(os.path.join(root, name))
+                   for root, _, names in os.walk(entry.path) for name in names]
+            )
+            if now - last_change < max_age:
+                continue
+            in_use = db.query(models.ImportJob.id).filter(
+                models.ImportJob.source == f"chunks:{entry.path}",
+                models.ImportJob.status.notin_(("completed", "failed")),
+            ).first()
+            if in_use is not None:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    finally:
+        db.close()
+    return removed
+
 @router.post("/finalize")
 async def finalize_upload(data: dict, background_tasks: BackgroundTasks):
-    """Combine chunks and process in background"""
+    """Stream chunks into the importer in background"""
     try:
         upload_id = data.get("uploadId")
-        filename = data.get("filename")
+        engine = data.get("engine")
+        if engine is not None and engine not in importer.IMPORT_ENGINES:
+            raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(importer.IMPORT_ENGINES)}")
         
-        upload_dir = f"/tmp/upload_chunks/{upload_id}"
+        upload_dir = f"{UPLOAD_ROOT}/{upload_id}"
         
         if not os.path.exists(upload_dir):
             raise HTTPException(status_code=404, detail="Upload not found")
         
-        chunks = sorted(
-            [f for f in os.listdir(upload_dir) if f.startswith("chunk_")],
-            key=lambda x: int(x.split("_")[1])
-        )
-        
-        combined_data = bytearray()
-        for chunk_file in chunks:
-            chunk_path = os.path.join(upload_dir, chunk_file)
-            with open(chunk_path, "rb") as f:
-                combined_data.extend(f.read())
-            os.remove(chunk_path)
+        if not importer.list_chunk_files(upload_dir):
+            raise HTTPException(status_code=400, detail="Upload has no chunks")
         
-        os.rmdir(upload_dir)
+        job_id = create_chunk_import_job(upload_dir)
         
-        db = SessionLocal()
-        try:
-            job = models.ImportJob(status="pending", total_rows=0, processed_rows=0)
-            db.add(job)
-            db.commit()
-            db.refresh(job)
-            job_id = job.id
-        finally:
-            db.close()
-        
-        background_tasks.add_task(process_csv_content, bytes(combined_data), job_id)
+        background_tasks.add_task(process_uploaded_chunks, upload_dir, job_id, data.get("profile"), engine)
         print(f"[FINALIZE] Processing started for job {job_id}")
         return {"job_id": job_id, "status": "started"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[ERROR] Finalize failed: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/jobs/{job_id}/retry")
+def retry_import(job_id: int, background_tasks: BackgroundTasks, profile: bool = Query(None),
+                 engine: str = Query(None, pattern="^(rows|columnar)$")):
+    """
+    Re-run a failed or interrupted import; it resumes from its last checkpoint.
+    Jobs that are still pending or running are refused unless they have not
+    made progress for IMPORT_STALE_SECONDS, so one job never runs twice at once.
+    """
+    db = SessionLocal()
+    try:
+        # the row lock makes concurrent retries of one job take turns
+        job = db.get(models.ImportJob, job_id, with_for_update=True)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.status == "completed":
+            raise HTTPException(status_code=400, detail="Job already completed")
+        if job.status != "failed":
+            stale_after = IMPORT_MERGE_STALE_SECONDS if job.status == "merging" else IMPORT_STALE_SECONDS
+            last_seen = job.updated_at or job.created_at
+            idle = (datetime.now(timezone.utc) - last_seen).total_seconds() if last_seen else None
+            if idle is not None and idle < stale_after:
+                raise HTTPException(status_code=409, detail=f"Job is still {job.status}; "
+                                    f"it can be retried once it fails or stalls for {stale_after}s")
+        kind, _, ref = (job.source or "").partition(":")
+        available = (
+            (kind == "chunks" and os.path.isdir(ref))
+            or (kind == "temp_files"
+                and db.query(models.TempFile.id).filter(models.TempFile.filename == ref).first() is not None)
+        )
+        if not available:
+            raise HTTPException(status_code=409, detail="Source data for this job is no longer available")
+        job.status = "pending"
+        job.error = None
+        db.commit()
+    finally:
+        db.close()
+
+    if kind == "chunks":
+        background_tasks.add_task(process_uploaded_chunks, ref, job_id, profile, engine)
+    else:
+        from ..tasks import process_csv_import
+        process_csv_import.delay(job_id, ref, profile=profile, engine=engine)
+    return {"job_id": job_id, "status": "restarted"}
+
+
+@router.get("/jobs/{job_id}/profile")
+def download_profile(job_id: int):
+    """Raw pstats dump of a profiled job, e.g. for `python -m pstats` or snakeviz"""
+    db = SessionLocal()
+    try:
+        data = db.query(models.ImportJob.profile_data).filter(models.ImportJob.id == job_id).scalar()
+    finally:
+        db.close()
+    if data is None:
+        raise HTTPException(status_code=404, detail="No profile recorded for this job")
+    return Response(bytes(data), media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="import-{job_id}.prof"'})
+
+
+@router.get("/jobs/{job_id}/profile/summary")
+def profile_summary(job_id: int):
+    """Top-N hot functions of a profiled job, by cumulative and by own time"""
+    db = SessionLocal()
+    try:
+        summary = db.query(models.ImportJob.profile_summary).filter(models.ImportJob.id == job_id).scalar()
+    finally:
+        db.close()
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No profile recorded for this job")
+    return PlainTextResponse(summary)
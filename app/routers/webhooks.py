@@ -4,7 +4,7 @@ from typing import List
 import requests
 import time
 from ..database import SessionLocal
-from .. import models, schemas
+from .. import models, schemas, webhook_registry
 
 router = APIRouter(prefix="/webhooks", tags=["webhooks"])
 
@@ -21,6 +21,7 @@ def add_webhook(h: schemas.WebhookCreate, db: Session = Depends(get_db)):
     db.add(wh)
     db.commit() 
     db.refresh(wh)
+    webhook_registry.notify_changed()
     return wh
 
 @router.get("/", response_model=List[schemas.WebhookRead])
@@ -37,6 +38,7 @@ def update_webhook(webhook_id: int, h: schemas.WebhookUpdate, db: Session = Depe
     wh.enabled = h.enabled
     db.commit()
     db.refresh(wh)
+    webhook_registry.notify_changed()
     return wh
 
 @router.delete("/{webhook_id}")
@@ -46,6 +48,7 @@ def delete_webhook(webhook_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Webhook not found")
     db.delete(wh)
     db.commit()
+    webhook_registry.notify_changed()
     return {"status": "deleted"}
 
 @router.post("/{webhook_id}/test")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, HttpUrl, ConfigDict
-from typing import Optional
+from typing import Literal, Optional
 
 class ProductCreate(BaseModel):
     sku: str
@@ -34,4 +34,17 @@ class WebhookRead(WebhookBase):
 class WebhookOut(WebhookBase):
     id: int
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0)
+    chunk_size: Optional[int] = Field(None, gt=0)
+
+class UploadComplete(BaseModel):
+    sha256: str
+    # "composite" is sha256 over the concatenated per-chunk digests, in chunk order
+    checksum_type: Literal["full", "composite"] = "full"
+    # run the import under the profiler; None follows the IMPORT_PROFILE setting
+    profile: Optional[bool] = None
+    # CSV parsing engine; None follows the IMPORT_ENGINE setting
+    engine: Optional[Literal["rows", "columnar"]] = None
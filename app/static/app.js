@@ -13,48 +13,91 @@ uploadBtn.onclick = async () => {
   progressBar.style.display = "block";
   progressBar.value = 0;
   
-  const CHUNK_SIZE = 5 * 1024 * 1024;
-  const totalChunks = Math.ceil(file.size / CHUNK_SIZE);
-  const uploadId = Date.now().toString() + Math.random().toString(36).substr(2, 9);
-  
+  const PARALLEL_UPLOADS = 4;
+  const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+
   try {
-    for (let chunkIndex = 0; chunkIndex < totalChunks; chunkIndex++) {
-      const start = chunkIndex * CHUNK_SIZE;
-      const end = Math.min(start + CHUNK_SIZE, file.size);
-      const chunk = file.slice(start, end);
-      
-      const formData = new FormData();
-      formData.append('chunk', chunk);
-      formData.append('chunkIndex', chunkIndex.toString());
-      formData.append('totalChunks', totalChunks.toString());
-      formData.append('uploadId', uploadId);
-      formData.append('filename', file.name);
-      
-      const response = await fetch("/upload/chunk", {
+    // resume the previous session for this exact file if the server still has it
+    let session = null;
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+      const res = await fetch(`/upload/sessions/${savedId}`);
+      if (res.ok) session = await res.json();
+    }
+    if (!session || session.job_id) {
+      const res = await fetch("/upload/sessions", {
         method: "POST",
-        body: formData
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({filename: file.name, size: file.size})
       });
-      
-      if (!response.ok) {
-        throw new Error(`Chunk ${chunkIndex + 1} upload failed`);
+      if (!res.ok) throw new Error("Failed to start upload");
+      session = await res.json();
+      localStorage.setItem(resumeKey, session.upload_id);
+    }
+
+    const uploadId = session.upload_id;
+    const totalChunks = session.total_chunks;
+    const received = new Set(session.received);
+    const pending = [];
+    for (let i = 0; i < totalChunks; i++) if (!received.has(i)) pending.push(i);
+    const digests = new Array(totalChunks);
+    let done = received.size;
+
+    const hex = (buf) => Array.from(new Uint8Array(buf)).map(b => b.toString(16).padStart(2, "0")).join("");
+
+    const sendChunk = async (chunkIndex) => {
+      const start = chunkIndex * session.chunk_size;
+      const body = await file.slice(start, Math.min(start + session.chunk_size, file.size)).arrayBuffer();
+      const digest = await crypto.subtle.digest("SHA-256", body);
+      for (let attempt = 1; ; attempt++) {
+        try {
+          const response = await fetch(`/upload/sessions/${uploadId}/chunks/${chunkIndex}`, {
+            method: "PUT",
+            headers: {"X-Chunk-SHA256": hex(digest)},
+            body
+          });
+          if (response.ok) break;
+          if (response.status < 500 || attempt >= 5) throw new Error(`Chunk ${chunkIndex + 1} upload failed`);
+        } catch (err) {
+          if (attempt >= 5) throw err;
+        }
+        await new Promise(r => setTimeout(r, 500 * 2 ** attempt));
       }
-      
-      const progress = Math.floor(((chunkIndex + 1) / totalChunks) * 100);
+      digests[chunkIndex] = digest;
+      done++;
+      const progress = Math.floor((done / totalChunks) * 100);
       progressBar.value = progress;
-      statusDiv.innerText = `Uploading... ${progress}% (${chunkIndex + 1}/${totalChunks} chunks)`;
+      statusDiv.innerText = `Uploading... ${progress}% (${done}/${totalChunks} chunks)`;
+    };
+
+    const worker = async () => {
+      while (pending.length) await sendChunk(pending.shift());
+    };
+    await Promise.all(Array.from({length: PARALLEL_UPLOADS}, worker));
+
+    // chunks that arrived in an earlier session still need their digest for the manifest
+    for (let i = 0; i < totalChunks; i++) {
+      if (!digests[i]) {
+        const start = i * session.chunk_size;
+        digests[i] = await crypto.subtle.digest(
+          "SHA-256", await file.slice(start, Math.min(start + session.chunk_size, file.size)).arrayBuffer());
+      }
     }
-    
+    const manifest = new Uint8Array(totalChunks * 32);
+    digests.forEach((d, i) => manifest.set(new Uint8Array(d), i * 32));
+
     statusDiv.innerText = "Upload complete, processing...";
     
-    const finalizeResponse = await fetch("/upload/finalize", {
+    const finalizeResponse = await fetch(`/upload/sessions/${uploadId}/complete`, {
       method: "POST",
       headers: {"Content-Type": "application/json"},
-      body: JSON.stringify({uploadId: uploadId, filename: file.name})
+      body: JSON.stringify({sha256: hex(await crypto.subtle.digest("SHA-256", manifest)), checksum_type: "composite"})
     });
     
     if (!finalizeResponse.ok) {
       throw new Error("Failed to finalize upload");
     }
+    localStorage.removeItem(resumeKey);
     
     const result = await finalizeResponse.json();
     
@@ -74,6 +117,9 @@ uploadBtn.onclick = async () => {
         progressBar.value = pct;
         statusDiv.innerText = `Importing... ${pct}% (${d.processed}/${d.total})`;
       } 
+      else if (d.status === "merging") {
+        statusDiv.innerText = `Merging ${d.processed} rows into the catalog...`;
+      }
       else if (d.status === "completed") {
         statusDiv.innerText = "Import Complete!";
         statusDiv.style.color = "green";
@@ -115,6 +161,7 @@ async function loadProducts() {
     sku, name, description
   });
   if (active) params.append("active", active);
+  params.append("fields", "id,sku,name,description,active");
 
   const res = await fetch("/products/?" + params.toString());
   const data = await res.json();
@@ -272,7 +319,29 @@ async function deleteAllProducts() {
     }
 
     const data = await res.json();
-    alert(`Deleted ${data.deleted} products successfully!`);
+    // the delete runs as a background job; follow its progress until it finishes
+    const job = await new Promise((resolve) => {
+      const es = new EventSource(`/events/import/${data.job_id}`);
+      es.onmessage = (evt) => {
+        if (!evt.data.trim()) return;
+        const d = JSON.parse(evt.data);
+        if (d.total) btn.textContent = `Deleting... ${d.processed}/${d.total}`;
+        if (d.status === "completed" || d.status === "failed") {
+          es.close();
+          resolve(d);
+        }
+      };
+      es.onerror = () => {
+        es.close();
+        resolve({status: "failed", error: "Lost connection to progress stream"});
+      };
+    });
+
+    if (job.status === "failed") {
+      alert(`Failed to delete products! ${job.error || ""}`);
+      return;
+    }
+    alert(`Deleted ${job.processed} products successfully!`);
 
     document.getElementById("productsTableBody").innerHTML = "";
   } catch (err) {
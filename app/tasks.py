@@ -1,128 +1,215 @@
 from .celery_app import celery
 from .database import SessionLocal
-from . import models, crud, utils
-import csv, os, httpx, tempfile,requests
+from . import models, crud, importer, metrics, outbox, profiling, utils, webhook_delivery, webhook_registry
+import os, tempfile,requests
 from io import TextIOWrapper
 from sqlalchemy.orm import Session
 import time
-from celery import shared_task
+from celery import shared_task, group, chord
 import traceback
 from uuid import uuid4
 
-BATCH_SIZE = 5000
+IMPORT_PARALLEL_PARTS = int(os.getenv("IMPORT_PARALLEL_PARTS", "4"))
+IMPORT_PARALLEL_MIN_BYTES = int(os.getenv("IMPORT_PARALLEL_MIN_BYTES", str(64 * 1024 * 1024)))
 
 @celery.task
-def process_csv_import(job_id, filename):
+def process_csv_import(job_id, filename, parallel=None, profile=None, engine=None):
     db: Session = SessionLocal()
-    temp_file_path = None
+    started = time.perf_counter()
+    profile = profiling.profiling_enabled(profile)
+    profiler = None
     
     try:
         job = db.query(models.ImportJob).get(job_id)
+        if job.status == "completed":
+            # redelivered after the job already finished
+            return True
+        if job.status in ("importing", "merging") and job.chord_id:
+            # redelivered after the ranges were fanned out; that chord finishes the job
+            print(f"[WORKER] Job {job_id} already has parallel import {job.chord_id} in flight")
+            return True
         job.status = "downloading"
+        job.error = None
+        job.chord_id = None
+        job.source = f"temp_files:{filename}"
         db.commit()
+        utils.publish_job_progress(job)
 
-        os.makedirs("/tmp/csv_processing", exist_ok=True)
-        temp_file_path = f"/tmp/csv_processing/{filename}"
-        
-        print(f"[WORKER] Reconstructing file: {filename}")
-        
-        chunks = (
-            db.query(models.TempFile)
-            .filter(models.TempFile.filename == filename)
-            .order_by(models.TempFile.chunk_index)
-            .all()
-        )
-        
-        if not chunks:
+        if (profile or (engine or importer.IMPORT_ENGINE) == "columnar") and parallel is None:
+            # one profile only covers one process, and ranges are always parsed
+            # row by row, so profiled and columnar jobs run serially
+            parallel = False
+        if parallel is None:
+            layout = importer.temp_file_layout(db, filename)
+            size = sum(chunk_size for _, _, chunk_size in layout)
+            parallel = IMPORT_PARALLEL_PARTS > 1 and size >= IMPORT_PARALLEL_MIN_BYTES
+        if parallel and start_parallel_import(db, job, filename):
+            return True
+
+        profiler = profiling.start(profile)
+        if db.query(models.TempFile.id).filter(models.TempFile.filename == filename).first() is None:
             raise FileNotFoundError(f"No file chunks found for: {filename}")
         
-        with open(temp_file_path, "wb") as f:
-            for chunk in chunks:
-                f.write(chunk.chunk_data)
-        
-        print(f"[WORKER] File reconstructed: {temp_file_path}")
-        
+        job.status = "importing"
+        db.commit()
+        utils.publish_job_progress(job)
+
+        # every pass streams the chunks straight out of temp_files into the parser
+        total, processed = importer.import_csv(
+            db, job, lambda: importer.IterStream(importer.iter_temp_file_chunks(filename)), engine=engine
+        )
+
+        # the chunks are only dropped once the job can no longer need a resume
         db.query(models.TempFile).filter(
             models.TempFile.filename == filename
         ).delete()
+        job.status = "completed"
+        job.processed_rows = processed
+        job.total_rows = total
         db.commit()
-        
-        job.status = "importing"
+        utils.publish_job_progress(job)
+        metrics.IMPORT_JOB_SECONDS.labels("serial").observe(time.perf_counter() - started)
+        metrics.IMPORT_JOBS_TOTAL.labels("serial", "completed").inc()
+        return True
+
+    except Exception as e:
+        db.rollback()
+        metrics.IMPORT_JOBS_TOTAL.labels("serial", "failed").inc()
+        job = db.query(models.ImportJob).get(job_id)
+        if job:
+            job.status = "failed"
+            job.error = str(e)
+            db.commit()
+            utils.publish_job_progress(job)
+        print("ERROR:", traceback.format_exc())
+        return False
+
+    finally:
+        profiling.finish(job_id, profiler)
+        db.close()
+
+def start_parallel_import(db: Session, job: models.ImportJob, filename: str) -> bool:
+    """
+    Split a stored CSV into record-aligned byte ranges and fan them out as a
+    chord. Returns False, starting nothing, if the file cannot be split.
+    """
+    layout = importer.temp_file_layout(db, filename)
+    if not layout:
+        raise FileNotFoundError(f"No file chunks found for: {filename}")
+    size = sum(chunk_size for _, _, chunk_size in layout)
+
+    fieldnames, ranges = importer.plan_csv_ranges(
+        importer.iter_temp_file_bytes(db, filename, layout), size, IMPORT_PARALLEL_PARTS
+    )
+    if ranges is None:
+        print(f"[WORKER] {filename} has CR-only line endings, importing it serially")
+        return False
+
+    # recorded before the fan-out, so a redelivered process_csv_import never starts a second chord
+    job.chord_id = uuid4().hex
+    job.status = "importing"
+    job.processed_rows = 0
+    job.total_rows = 0
+    db.commit()
+    utils.publish_job_progress(job)
+
+    print(f"[WORKER] Importing {filename} in {len(ranges)} ranges")
+    header = group(
+        import_csv_range.s(job.id, filename, fieldnames, start, end, part)
+        for part, (start, end) in enumerate(ranges)
+    )
+    body = (finalize_parallel_import.s(job.id, filename)
+            .set(task_id=job.chord_id)
+            .on_error(fail_parallel_import.s(job.id)))
+    chord(header)(body)
+    return True
+
+@celery.task
+def import_csv_range(job_id, filename, fieldnames, start, end, part):
+    db: Session = SessionLocal()
+    try:
+        # a redelivered range starts over, so drop whatever it staged before
+        db.query(models.ImportStaging).filter(
+            models.ImportStaging.job_id == job_id, models.ImportStaging.part == part
+        ).delete(synchronize_session=False)
         db.commit()
+        layout = importer.temp_file_layout(db, filename)
+        stream = importer.IterStream(importer.iter_temp_file_bytes(db, filename, layout, start, end))
+        with importer.open_csv_text(stream) as text_stream:
+            return importer.stage_csv_range(db, job_id, part, text_stream, fieldnames)
+    finally:
+        db.close()
 
-        total = 0
-        processed = 0
-        batch = []
-        seen = set()
-        
-        SEEN_CLEAR_INTERVAL = 10000
-
-        with open(temp_file_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            
-            for row in reader:
-                total += 1
-
-                sku = row.get("sku")
-                if not sku:
-                    continue
-
-                normalized = sku.strip().lower()
-                if normalized in seen:
-                    continue
-                seen.add(normalized)
-
-                batch.append({
-                    "sku": sku.strip(),
-                    "name": row.get("name", "").strip()[:512],
-                    "description": row.get("description", "")[:2000],
-                    "price": row.get("price") if "price" in row else None,
-                    "active": True,
-                })
-
-                if len(batch) >= BATCH_SIZE:
-                    crud.create_or_update_products_bulk(db, batch)
-                    processed += len(batch)
-                    batch = []
-                    
-                    if total % SEEN_CLEAR_INTERVAL == 0:
-                        seen = set()
-
-                    job.processed_rows = processed
-                    job.total_rows = total
-                    db.commit()
-                    db.expire_all()
-
-            if batch:
-                crud.create_or_update_products_bulk(db, batch)
-                processed += len(batch)
+@celery.task(bind=True)
+def finalize_parallel_import(self, range_totals, job_id, filename):
+    db: Session = SessionLocal()
+    try:
+        job = db.query(models.ImportJob).get(job_id)
+        if job.chord_id and job.chord_id != self.request.id:
+            # a retry fanned the job out again; only its own chord may merge
+            print(f"[WORKER] Skipping superseded parallel import {self.request.id} of job {job_id}")
+            return False
+
+        # the merge is one long statement that reports no progress; the status
+        # (and updated_at) tell retry_import the job is alive and merging
+        job.status = "merging"
+        db.commit()
+        utils.publish_job_progress(job)
+
+        with metrics.import_stage("merge"):
+            counts = crud.merge_staged_products(db, job_id)
 
+        db.query(models.TempFile).filter(
+            models.TempFile.filename == filename
+        ).delete()
+
+        job = db.query(models.ImportJob).get(job_id)
         job.status = "completed"
-        job.processed_rows = processed
-        job.total_rows = total
+        job.processed_rows = sum(counts.values())
+        job.total_rows = sum(range_totals)
+        importer.set_job_counts(job, counts)
         db.commit()
-        
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-                
+        utils.publish_job_progress(job)
+        metrics.IMPORT_JOBS_TOTAL.labels("parallel", "completed").inc()
+        for outcome, n in counts.items():
+            metrics.IMPORT_ROWS_TOTAL.labels(outcome).inc(n)
         return True
 
     except Exception as e:
+        db.rollback()
+        metrics.IMPORT_JOBS_TOTAL.labels("parallel", "failed").inc()
+        try:
+            # a retry starts over, so the staged rows would only leak
+            crud.discard_staged_products(db, job_id)
+        except Exception:
+            db.rollback()
+            print("ERROR:", traceback.format_exc())
         job = db.query(models.ImportJob).get(job_id)
         if job:
             job.status = "failed"
             job.error = str(e)
             db.commit()
+            utils.publish_job_progress(job)
         print("ERROR:", traceback.format_exc())
-        
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            
         return False
 
     finally:
         db.close()
 
+@celery.task
+def fail_parallel_import(request, exc, traceback_, job_id):
+    db: Session = SessionLocal()
+    try:
+        crud.discard_staged_products(db, job_id)
+        job = db.query(models.ImportJob).get(job_id)
+        if job:
+            job.status = "failed"
+            job.error = str(exc)
+            db.commit()
+            utils.publish_job_progress(job)
+    finally:
+        db.close()
+
 @celery.task
 def cleanup_old_csv_files():
     """Clean up CSV files older than 24 hours"""
@@ -144,6 +231,15 @@ def cleanup_old_csv_files():
                 except:
                     pass
 
+@celery.task
+def cleanup_upload_sessions():
+    """Remove abandoned upload directories under UPLOAD_ROOT; run periodically by beat"""
+    from .routers.upload import expire_upload_sessions
+    removed = expire_upload_sessions()
+    if removed:
+        print(f"[CLEANUP] Removed {removed} abandoned upload directories")
+    return removed
+
 @celery.task
 def trigger_webhook(webhook_id: int, job_id: int = None,
                     product_id: int = None, event: str = None):
@@ -153,18 +249,44 @@ def trigger_webhook(webhook_id: int, job_id: int = None,
         if not wh or not wh.enabled:
             return {"status": "disabled"}
 
-        payload = {"event": wh.event}
+        payload = {"event": event or wh.event_type}
         if job_id:
             payload["job_id"] = job_id
         if product_id:
             payload["product_id"] = product_id
 
-        with httpx.Client(timeout=10) as client:
-            r = client.post(wh.url, json=payload)
-            return {"status_code": r.status_code, "text": r.text}
+        webhook_delivery.enqueue_deliveries(db, [wh], payload["event"], payload)
+        db.commit()
 
     except Exception as e:
         return {"error": str(e)}
 
     finally:
         db.close()
+
+    return webhook_delivery.get_engine().dispatch()
+
+@celery.task
+def deliver_webhook_event(event_type: str, payload: dict, subscriptions: list):
+    """Persist one delivery per [webhook_id, url] subscription in a single insert, then send"""
+    db = SessionLocal()
+    try:
+        webhooks = [webhook_registry.Subscription(*s) for s in subscriptions]
+        webhook_delivery.enqueue_deliveries(db, webhooks, event_type, payload)
+        db.commit()
+    finally:
+        db.close()
+
+    return webhook_delivery.get_engine().dispatch()
+
+@celery.task
+def drain_product_outbox():
+    """Turn bulk-import change events into batched webhook deliveries; run periodically by beat"""
+    if outbox.drain_outbox():
+        return webhook_delivery.get_engine().dispatch()
+    return {}
+
+@celery.task
+def dispatch_webhook_deliveries():
+    """Send every due delivery, including persisted retries; run periodically by beat"""
+    return webhook_delivery.get_engine().dispatch()
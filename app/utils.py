@@ -1,12 +1,38 @@
 import json
 import os
 from redis import Redis
+from redis.exceptions import RedisError
 from dotenv import load_dotenv
 load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL")
 redis_cli = Redis.from_url(REDIS_URL)
 
+PROGRESS_CHANNEL_PREFIX = "import:progress:"
+
 def publish_progress(job_id: int, payload: dict):
-    channel = f"import:progress:{job_id}"
+    channel = f"{PROGRESS_CHANNEL_PREFIX}{job_id}"
     redis_cli.publish(channel, json.dumps(payload))
+
+def job_progress_payload(job) -> dict:
+    return {
+        "kind": job.kind,
+        "status": job.status,
+        "processed": job.processed_rows,
+        "total": job.total_rows,
+        "inserted": job.inserted_rows,
+        "updated": job.updated_rows,
+        "unchanged": job.unchanged_rows,
+        "dedup_bytes": job.dedup_bytes,
+        "error": job.error,
+    }
+
+def try_publish_progress(job_id: int, payload: dict):
+    """Best-effort progress push; SSE clients fall back to the DB if it is lost"""
+    try:
+        publish_progress(job_id, payload)
+    except RedisError as e:
+        print(f"[WARN] Progress publish failed for job {job_id}: {e}")
+
+def publish_job_progress(job):
+    try_publish_progress(job.id, job_progress_payload(job))
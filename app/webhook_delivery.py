@@ -0,0 +1,233 @@
+import asyncio
+import os
+import random
+from collections import Counter, defaultdict
+from typing import List
+from urllib.parse import urlsplit
+import httpx
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from . import models, metrics
+
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_BASE_SECONDS", "2"))
+WEBHOOK_BACKOFF_MAX_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_MAX_SECONDS", "3600"))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "200"))
+WEBHOOK_PER_HOST_CONCURRENCY = int(os.getenv("WEBHOOK_PER_HOST_CONCURRENCY", "10"))
+# a claimed delivery becomes due again after this long, so a crashed worker loses nothing
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "120"))
+WEBHOOK_DISPATCH_BUDGET_SECONDS = float(os.getenv("WEBHOOK_DISPATCH_BUDGET_SECONDS", "50"))
+
+RETRIABLE_STATUS_CODES = {408, 425, 429}
+# failures that will not go away on a retry: a bad registered url or a payload that does not encode
+PERMANENT_ERRORS = (httpx.InvalidURL, httpx.UnsupportedProtocol, TypeError, ValueError)
+# how long a delivery waits when its host is already at its concurrency cap
+HOST_BUSY_DELAY_SECONDS = 1
+
+CLAIM_DUE_SQL = text("""
+UPDATE webhook_deliveries
+   SET attempts = attempts + 1,
+       next_attempt_at = now() + make_interval(secs => :lease)
+ WHERE id IN (
+    SELECT id FROM webhook_deliveries
+     WHERE next_attempt_at <= now()
+     ORDER BY next_attempt_at
+     LIMIT :limit
+     FOR UPDATE SKIP LOCKED
+ )
+RETURNING id, webhook_id, url, event_type, payload, attempts
+""")
+
+RESCHEDULE_SQL = text("""
+UPDATE webhook_deliveries
+   SET next_attempt_at = now() + make_interval(secs => :delay),
+       last_error = :error,
+       last_status_code = :status_code
+ WHERE id = :id
+""")
+
+DEFER_SQL = text("""
+UPDATE webhook_deliveries
+   SET next_attempt_at = now() + make_interval(secs => :delay),
+       attempts = attempts - 1
+ WHERE id = ANY(:ids)
+""")
+
+DEAD_LETTER_SQL = text("""
+INSERT INTO webhook_dead_letters
+    (delivery_id, webhook_id, url, event_type, payload, attempts, last_error, last_status_code, created_at)
+SELECT id, webhook_id, url, event_type, payload, attempts, :error, :status_code, created_at
+  FROM webhook_deliveries
+ WHERE id = :id
+""")
+
+
+def enqueue_deliveries(db: Session, webhooks, event_type: str, payload: dict) -> int:
+    """Persist one pending delivery per webhook; the caller commits."""
+    rows = [
+        {"webhook_id": wh.id, "url": wh.url, "event_type": event_type, "payload": payload}
+        for wh in webhooks
+    ]
+    if rows:
+        db.execute(insert(models.WebhookDelivery), rows)
+    return len(rows)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for the given attempt number."""
+    cap = min(WEBHOOK_BACKOFF_MAX_SECONDS, WEBHOOK_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+    return random.uniform(cap / 2, cap)
+
+
+def claim_due(limit: int) -> List[dict]:
+    db = SessionLocal()
+    try:
+        rows = db.execute(CLAIM_DUE_SQL, {"limit": limit, "lease": WEBHOOK_LEASE_SECONDS}).mappings().all()
+        db.commit()
+        return [dict(r) for r in rows]
+    finally:
+        db.close()
+
+
+def record_outcomes(outcomes: List[dict]):
+    """Delete delivered rows, reschedule retriable failures and dead-letter the rest."""
+    for o in outcomes:
+        metrics.WEBHOOK_DELIVERIES_TOTAL.labels(o["status"]).inc()
+    delivered = [o["id"] for o in outcomes if o["status"] == "delivered"]
+    deferred = [o["id"] for o in outcomes if o["status"] == "deferred"]
+    retries = [o for o in outcomes if o["status"] == "retry"]
+    dead = [o for o in outcomes if o["status"] == "dead"]
+
+    db = SessionLocal()
+    try:
+        if deferred:
+            db.execute(DEFER_SQL, {"ids": deferred, "delay": HOST_BUSY_DELAY_SECONDS})
+        if retries:
+            db.execute(RESCHEDULE_SQL, [
+                {"id": o["id"], "delay": backoff_delay(o["attempts"]),
+                 "error": o["error"], "status_code": o["status_code"]}
+                for o in retries
+            ])
+        if dead:
+            db.execute(DEAD_LETTER_SQL, [
+                {"id": o["id"], "error": o["error"], "status_code": o["status_code"]}
+                for o in dead
+            ])
+        finished = delivered + [o["id"] for o in dead]
+        if finished:
+            db.execute(text("DELETE FROM webhook_deliveries WHERE id = ANY(:ids)"), {"ids": finished})
+        db.commit()
+    finally:
+        db.close()
+
+
+def failed_outcome(delivery: dict, error: str, retriable: bool, status_code: int = None) -> dict:
+    """Retry a failed delivery while it has attempts left, otherwise dead-letter it."""
+    status = "retry" if retriable and delivery["attempts"] < WEBHOOK_MAX_ATTEMPTS else "dead"
+    return {"id": delivery["id"], "attempts": delivery["attempts"], "status": status,
+            "status_code": status_code, "error": error}
+
+
+class DeliveryEngine:
+    """
+    Sends webhook deliveries concurrently from one long-lived event loop per
+    worker process, so the pooled keep-alive connections of the shared
+    AsyncClient survive between tasks. Each target host gets its own
+    concurrency cap, so a slow receiver only occupies its own slots.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._client = None
+        self._host_slots = defaultdict(lambda: asyncio.Semaphore(WEBHOOK_PER_HOST_CONCURRENCY))
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=WEBHOOK_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=WEBHOOK_MAX_CONCURRENCY,
+                    max_keepalive_connections=WEBHOOK_MAX_CONCURRENCY,
+                ),
+            )
+        return self._client
+
+    def dispatch(self, budget_seconds: float = WEBHOOK_DISPATCH_BUDGET_SECONDS) -> dict:
+        return self.loop.run_until_complete(self._dispatch(budget_seconds))
+
+    async def _dispatch(self, budget_seconds: float) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + budget_seconds
+        inflight = set()
+        claimed_by_task = {}
+        counts = Counter()
+        refill_at = max(WEBHOOK_MAX_CONCURRENCY // 4, 1)
+
+        while True:
+            room = WEBHOOK_MAX_CONCURRENCY - len(inflight)
+            if loop.time() < deadline and (room >= refill_at or not inflight):
+                claimed = await loop.run_in_executor(None, claim_due, room)
+                for delivery in claimed:
+                    task = asyncio.ensure_future(self._deliver(delivery))
+                    claimed_by_task[task] = delivery
+                    inflight.add(task)
+            if not inflight:
+                break
+
+            done, inflight = await asyncio.wait(inflight, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+            outcomes = []
+            for task in done:
+                delivery = claimed_by_task.pop(task)
+                if task.cancelled() or task.exception() is not None:
+                    # never let one delivery keep the rest of the batch from being recorded
+                    error = "cancelled" if task.cancelled() else repr(task.exception())
+                    outcomes.append(failed_outcome(delivery, error, retriable=True))
+                else:
+                    outcomes.append(task.result())
+            if outcomes:
+                await loop.run_in_executor(None, record_outcomes, outcomes)
+                counts.update(o["status"] for o in outcomes)
+
+        return dict(counts)
+
+    async def _deliver(self, delivery: dict) -> dict:
+        try:
+            slots = self._host_slots[urlsplit(delivery["url"]).netloc]
+            if slots.locked():
+                # hand the slot back instead of queueing behind a slow receiver
+                return {"id": delivery["id"], "attempts": delivery["attempts"],
+                        "status": "deferred", "status_code": None, "error": None}
+            async with slots:
+                with metrics.WEBHOOK_DELIVERY_SECONDS.time():
+                    r = await self.client.post(
+                        delivery["url"],
+                        json=delivery["payload"],
+                        headers={
+                            "X-Webhook-Event": delivery["event_type"],
+                            "X-Webhook-Delivery": str(delivery["id"]),
+                        },
+                    )
+        except PERMANENT_ERRORS as e:
+            return failed_outcome(delivery, f"{type(e).__name__}: {e}", retriable=False)
+        except Exception as e:
+            return failed_outcome(delivery, f"{type(e).__name__}: {e}", retriable=True)
+
+        if r.is_success:
+            return {"id": delivery["id"], "attempts": delivery["attempts"],
+                    "status": "delivered", "status_code": r.status_code, "error": None}
+        retriable = r.status_code >= 500 or r.status_code in RETRIABLE_STATUS_CODES
+        return failed_outcome(delivery, f"HTTP {r.status_code}", retriable, r.status_code)
+
+
+_engine = None
+
+
+def get_engine() -> DeliveryEngine:
+    """Created lazily so every forked worker process gets its own loop and pool."""
+    global _engine
+    if _engine is None:
+        _engine = DeliveryEngine()
+    return _engine
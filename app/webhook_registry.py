@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from collections import defaultdict, namedtuple
+from redis.exceptions import RedisError
+from .database import SessionLocal
+from . import models, utils
+
+WEBHOOK_REGISTRY_TTL_SECONDS = float(os.getenv("WEBHOOK_REGISTRY_TTL_SECONDS", "60"))
+INVALIDATE_CHANNEL = "webhooks:invalidate"
+
+Subscription = namedtuple("Subscription", ["id", "url"])
+
+
+class SubscriptionRegistry:
+    """
+    In-process cache of enabled webhooks keyed by event type. Entries are
+    dropped when any process publishes on INVALIDATE_CHANNEL, and reloaded
+    after WEBHOOK_REGISTRY_TTL_SECONDS regardless, in case a message is lost.
+    """
+
+    def __init__(self, ttl: float = WEBHOOK_REGISTRY_TTL_SECONDS):
+        self._ttl = ttl
+        self._by_event = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def get(self, event_type: str):
+        self._ensure_listener()
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self._ttl:
+            self._reload()
+        return self._by_event.get(event_type, ())
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _reload(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self._ttl:
+                return
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(models.Webhook.id, models.Webhook.url, models.Webhook.event_type)
+                    .filter(models.Webhook.enabled == True)
+                    .all()
+                )
+            finally:
+                db.close()
+            by_event = defaultdict(list)
+            for webhook_id, url, event_type in rows:
+                by_event[event_type].append(Subscription(webhook_id, url))
+            self._by_event = {k: tuple(v) for k, v in by_event.items()}
+            self._loaded_at = time.monotonic()
+
+    def _ensure_listener(self):
+        if self._listener is None or not self._listener.is_alive():
+            self._listener = threading.Thread(target=self._listen, name="webhook-registry", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = utils.redis_cli.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                # anything may have changed while we were not subscribed
+                self.invalidate()
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.invalidate()
+            except RedisError as e:
+                print(f"[WARN] Webhook registry subscription lost, retrying: {e}")
+                self.invalidate()
+                time.sleep(1)
+
+
+registry = SubscriptionRegistry()
+
+
+def notify_changed():
+    """Tell every process to drop its cached subscriptions"""
+    registry.invalidate()
+    try:
+        utils.redis_cli.publish(INVALIDATE_CHANNEL, "1")
+    except RedisError as e:
+        print(f"[WARN] Webhook registry invalidation failed, relying on TTL: {e}")
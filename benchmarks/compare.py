@@ -0,0 +1,62 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json current.json [--threshold 0.10]
+
+A stage regresses when its time grows by more than the threshold (as a
+fraction of the baseline); peak RSS is checked the same way. Exits 1 if
+anything regressed.
+"""
+import argparse
+import json
+import sys
+
+
+def _index(results: dict) -> dict:
+    return {run["rows_requested"]: run for run in results["runs"]}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10):
+    """Return (lines, regressions) describing every stage present in both files."""
+    lines = []
+    regressions = []
+    old_runs = _index(baseline)
+    for rows, run in sorted(_index(current).items()):
+        old = old_runs.get(rows)
+        if old is None:
+            continue
+        metrics = [(stage, old["stages"][stage]["seconds"], m["seconds"], "s")
+                   for stage, m in run["stages"].items() if stage in old["stages"]]
+        metrics.append(("peak_rss", old["peak_rss_bytes"] / 2 ** 20, run["peak_rss_bytes"] / 2 ** 20, "MiB"))
+        for name, before, after, unit in metrics:
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions.append((rows, name, change))
+            elif change < -threshold:
+                flag = "  improved"
+            lines.append(f"{rows:>10} {name:<10} {before:10.3f}{unit:<3} -> {after:10.3f}{unit:<3} {change:+7.1%}{flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    lines, regressions = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
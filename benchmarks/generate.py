@@ -0,0 +1,70 @@
+"""
+Deterministic synthetic product CSV generator.
+
+    python -m benchmarks.generate out.csv --rows 1000000 --dup-ratio 0.1
+
+The same arguments always produce byte-identical files.
+"""
+import argparse
+import csv
+import random
+
+WORDS = (
+    "steel", "cotton", "premium", "compact", "wireless", "classic", "organic", "portable",
+    "deluxe", "ergonomic", "vintage", "modular", "outdoor", "smart", "eco", "heavy-duty",
+)
+UNICODE_WORDS = ("café", "Ünïcödé", "東京", "Ñandú", "crème brûlée", "Zürich", "naïve", "😀", "Straße", "Ελλάδα")
+
+
+def product_rows(rows: int, dup_ratio: float = 0.1, desc_length: int = 200,
+                 unicode_ratio: float = 0.1, seed: int = 42):
+    """Yield (sku, name, description, price) tuples; dup_ratio of rows repeat an earlier sku."""
+    rng = random.Random(seed)
+    unique = 0
+    for _ in range(rows):
+        if unique and rng.random() < dup_ratio:
+            n = rng.randrange(unique)
+        else:
+            n = unique
+            unique += 1
+        words = UNICODE_WORDS if rng.random() < unicode_ratio else WORDS
+        name = " ".join(rng.choice(words) for _ in range(3)).title()
+        parts = []
+        length = 0
+        while length < desc_length:
+            word = rng.choice(words)
+            if rng.random() < 0.05:
+                # exercise csv quoting
+                word += rng.choice((",", '"', "\n"))
+            parts.append(word)
+            length += len(word) + 1
+        description = " ".join(parts)[:desc_length]
+        price = f"{rng.randrange(100, 100000) / 100:.2f}"
+        # case varies between duplicates, which must still collapse onto one product
+        sku = f"SKU-{n:08d}" if rng.random() < 0.5 else f"sku-{n:08d}"
+        yield sku, name, description, price
+
+
+def write_csv(path: str, rows: int, **options) -> str:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("sku", "name", "description", "price"))
+        writer.writerows(product_rows(rows, **options))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dup-ratio", type=float, default=0.1)
+    parser.add_argument("--desc-length", type=int, default=200)
+    parser.add_argument("--unicode-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, dup_ratio=args.dup_ratio, desc_length=args.desc_length,
+              unicode_ratio=args.unicode_ratio, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
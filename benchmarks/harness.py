@@ -0,0 +1,156 @@
+"""
+Time a serial CSV import of one file through importer.import_csv against
+the database in DATABASE_URL, and write the measurements as JSON.
+
+    python -m benchmarks.harness products.csv --result-file out.json [--truncate] [--engine columnar]
+
+Stages:
+  reassembly  stream the file back out of temp_files chunks, as a serial import reads it
+  pipeline    wall time of import_csv, both passes included
+  dedup       first pass building the file-wide last-row index
+  parse       reading, parsing and filtering rows between upserts
+  encode      building the COPY payloads
+  copy        COPY into the staging table
+  merge       staging -> products merge statements
+  upsert      encode + copy + merge
+  commit      batch commits (progress row and data)
+
+Everything but reassembly and pipeline is read off the importer's own
+metrics.import_stage histograms, so the numbers are those of the code the
+workers run. Peak RSS is sampled after every stage; run one file per
+process so the numbers do not carry over between sizes.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from app import crud, importer, metrics, models
+from app.database import SessionLocal
+
+IMPORT_STAGES = ("dedup", "parse", "encode", "copy", "merge", "commit")
+UPLOAD_CHUNK_BYTES = 5 * 1024 * 1024
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def store_chunks(db, path: str, filename: str) -> int:
+    """Load the file into temp_files the way the upload path stores it (untimed setup)."""
+    chunks = 0
+    with open(path, "rb") as f:
+        for index, data in enumerate(iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b"")):
+            db.add(models.TempFile(filename=filename, chunk_index=index, chunk_data=data))
+            db.commit()
+            chunks += 1
+    return chunks
+
+
+def stage_seconds() -> dict:
+    """Running totals of metrics.import_stage per stage in this process."""
+    totals = {}
+    for metric in metrics.IMPORT_STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_sum"):
+                totals[sample.labels["stage"]] = sample.value
+    return totals
+
+
+def run(path: str, batch_size: int = None, truncate: bool = False, reassembly: bool = True,
+        engine: str = None) -> dict:
+    batch_size = batch_size or crud.UPSERT_BATCH_ROWS
+    engine = engine or importer.IMPORT_ENGINE
+    stages = {}
+    result = {
+        "file": os.path.basename(path),
+        "bytes": os.path.getsize(path),
+        "batch_size": batch_size,
+        "engine": engine,
+        "stages": stages,
+    }
+
+    def record(stage: str, seconds: float, rows: int):
+        stages[stage] = {
+            "seconds": round(seconds, 4),
+            "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+        print(f"[BENCH] {stage:<10} {seconds:9.3f}s  {stages[stage]['rows_per_sec']} rows/s", file=sys.stderr)
+
+    db = SessionLocal()
+    filename = f"bench-{uuid4().hex}"
+    job = models.ImportJob(status="importing", total_rows=0, processed_rows=0)
+    db.add(job)
+    if truncate:
+        db.execute(text("TRUNCATE products"))
+    db.commit()
+    job_id = job.id
+
+    try:
+        if reassembly:
+            result["chunks"] = store_chunks(db, path, filename)
+            t = time.perf_counter()
+            with importer.IterStream(importer.iter_temp_file_chunks(filename)) as stream:
+                while stream.read(importer.READ_BUFFER_SIZE):
+                    pass
+            reassembly_seconds = time.perf_counter() - t
+
+        before = stage_seconds()
+        t = time.perf_counter()
+        total, processed = importer.import_csv(db, job, lambda: open(path, "rb"),
+                                               batch_size=batch_size, engine=engine)
+        pipeline_seconds = time.perf_counter() - t
+        after = stage_seconds()
+
+        if reassembly:
+            record("reassembly", reassembly_seconds, total)
+        spent = {stage: after.get(stage, 0.0) - before.get(stage, 0.0) for stage in IMPORT_STAGES}
+        for stage in IMPORT_STAGES:
+            record(stage, spent[stage], processed if stage in ("encode", "copy", "merge") else total)
+        record("upsert", spent["encode"] + spent["copy"] + spent["merge"], processed)
+        record("pipeline", pipeline_seconds, total)
+
+        job = db.get(models.ImportJob, job_id, populate_existing=True)
+        result["rows"] = total
+        result["upserted"] = processed
+        result["dedup_bytes"] = job.dedup_bytes
+        result["counts"] = {"inserted": job.inserted_rows, "updated": job.updated_rows,
+                            "unchanged": job.unchanged_rows}
+        result["peak_rss_bytes"] = peak_rss_bytes()
+        return result
+    finally:
+        db.rollback()
+        db.query(models.TempFile).filter(models.TempFile.filename == filename).delete()
+        db.query(models.ImportJob).filter(models.ImportJob.id == job_id).delete()
+        db.commit()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--result-file", required=True)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--truncate", action="store_true",
+                        help="empty products first, so every run measures inserts (destructive)")
+    parser.add_argument("--skip-reassembly", action="store_true")
+    parser.add_argument("--engine", choices=importer.IMPORT_ENGINES, default=None,
+                        help="import engine (default: IMPORT_ENGINE)")
+    args = parser.parse_args()
+
+    result = run(args.path, batch_size=args.batch_size, truncate=args.truncate,
+                 reassembly=not args.skip_reassembly, engine=args.engine)
+    with open(args.result_file, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Run the import benchmark for several file sizes and save the results.
+
+    python -m benchmarks.run --sizes 100000 1000000 10000000 --truncate \
+        [--baseline benchmarks/results/<earlier>.json]
+
+Input files are generated once into benchmarks/data/ (deterministic for the
+given options) and reused. Each size runs in its own process, so peak RSS
+is per size. Results go to benchmarks/results/<timestamp>-<commit>.json and,
+with --baseline, are compared against an earlier run (exit 1 on regression).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from . import compare, generate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_SIZES = (100000, 1000000, 10000000)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def data_file(rows: int, options: dict) -> str:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    name = "products-{rows}-d{dup_ratio}-l{desc_length}-u{unicode_ratio}-s{seed}.csv".format(rows=rows, **options)
+    path = os.path.join(DATA_DIR, name)
+    if not os.path.exists(path):
+        print(f"[BENCH] generating {name}", file=sys.stderr)
+        generate.write_csv(path + ".tmp", rows, **options)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def run_size(path: str, args) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as out:
+        cmd = [sys.executable, "-m", "benchmarks.harness", path, "--result-file", out.name]
+        if args.batch_size:
+            cmd += ["--batch-size", str(args.batch_size)]
+        if args.truncate:
+            cmd.append("--truncate")
+        if args.skip_reassembly:
+            cmd.append("--skip-reassembly")
+        if args.engine:
+            cmd += ["--engine", args.engine]
+        subprocess.run(cmd, check=True, cwd=os.path.dirname(BENCH_DIR))
+        with open(out.name) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--dup-ratio", type=float, default=0.1)
+    parser.add_argument("--desc-length", type=int, default=200)
+    parser.add_argument("--unicode-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--truncate", action="store_true",
+                        help="empty products before each size (destructive; use a scratch database)")
+    parser.add_argument("--skip-reassembly", action="store_true")
+    parser.add_argument("--engine", choices=("rows", "columnar"), default=None)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    options = {"dup_ratio": args.dup_ratio, "desc_length": args.desc_length,
+               "unicode_ratio": args.unicode_ratio, "seed": args.seed}
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "engine": args.engine,
+        "runs": [],
+    }
+    for rows in args.sizes:
+        run = run_size(data_file(rows, options), args)
+        run["rows_requested"] = rows
+        results["runs"].append(run)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{commit}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[BENCH] results written to {output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare.compare(baseline, results, args.threshold)
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import csv
+import io
+import random
+
+import pytest
+
+pytest.importorskip("pandas")
+
+from app import crud, importer, models, product_cache, utils
+
+
+class FakeCursor:
+    """Stands in for the psycopg2 cursor of an ImportSession and keeps every COPY payload."""
+
+    def __init__(self, copied: list):
+        self.copied = copied
+        self._last = None
+        self._staged = 0
+
+    def execute(self, sql, params=None):
+        self._last = sql
+
+    def copy_expert(self, sql, buf):
+        lines = buf.read().splitlines()
+        self.copied.extend(lines)
+        self._staged = len(lines)
+
+    def fetchone(self):
+        if self._last.startswith("EXECUTE import_merge"):
+            return self._staged, self._staged, 0
+        return (None,) * len(crud.PROGRESS_COLUMNS)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, copied: list):
+        self.copied = copied
+
+    def cursor(self):
+        return FakeCursor(self.copied)
+
+    def commit(self):
+        pass
+
+    rollback = invalidate = close = commit
+
+
+class FakeBind:
+    def __init__(self):
+        self.copied = []
+
+    def raw_connection(self):
+        return FakeConnection(self.copied)
+
+
+class FakeDb:
+    def __init__(self):
+        self.bind = FakeBind()
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(utils, "try_publish_progress", lambda job_id, payload: None)
+    monkeypatch.setattr(product_cache, "bump_generation", lambda: None)
+    monkeypatch.setattr(crud, "outbox_enabled", lambda: False)
+
+
+def staged_rows(data: bytes, engine: str, batch_size: int):
+    db = FakeDb()
+    job = models.ImportJob(id=1)
+    total, processed = importer.import_csv(db, job, lambda: io.BytesIO(data), batch_size=batch_size, engine=engine)
+    # ords number rows within a COPY batch, and the engines cut batches differently
+    return total, processed, [line.split("\t", 1)[1] for line in db.bind.copied]
+
+
+def make_csv(rows: int, seed: int, header) -> bytes:
+    rng = random.Random(seed)
+    skus = [f"SKU-{i}" for i in range(rows // 3 + 1)] + ["ünï-1", "Ünï-1", "tab\tsku", "back\\slash"]
+    values = {
+        "sku": lambda: rng.choice(["", "  ", " " + rng.choice(skus) + " ", rng.choice(skus).lower(), rng.choice(skus)]),
+        "name": lambda: rng.choice(["", " padded ", "n" * 600, "multi\nline", "esc \\ \t"]),
+        "description": lambda: rng.choice(["", "d" * 2500, 'quote " and, comma', "line\r\nbreak", " keep spaces "]),
+        "price": lambda: rng.choice(["", "1.50", "abc", " 2 "]),
+        "extra": lambda: "ignored",
+    }
+    out = io.StringIO(newline="")
+    writer = csv.writer(out, lineterminator=rng.choice(["\n", "\r\n"]))
+    writer.writerow(header)
+    for _ in range(rows):
+        writer.writerow([values[column]() for column in header])
+    return out.getvalue().encode("utf-8")
+
+
+@pytest.mark.parametrize("header", [
+    ["sku", "name", "description", "price"],
+    ["extra", "price", "sku", "description", "name"],
+    ["sku", "name"],
+    ["name", "extra"],
+])
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("batch_size", [7, 1000])
+def test_columnar_engine_stages_the_same_rows(header, seed, batch_size):
+    data = make_csv(300, seed, header)
+    rows = staged_rows(data, "rows", batch_size)
+    columnar = staged_rows(data, "columnar", batch_size)
+    assert columnar == rows
+    if "sku" in header:
+        assert rows[2]
+
+
+def test_columnar_resumes_on_the_engine_that_wrote_the_checkpoint():
+    job = models.ImportJob(id=1, checkpoint_batch=2, checkpoint_offset=6, checkpoint_rows=1)
+    db = FakeDb()
+    importer.import_csv(db, job, lambda: io.BytesIO(b"sku\nA\nB\n"), engine="columnar")
+    assert job.engine == "rows"
+    # the row engine resumed after the 6-byte checkpoint ("sku\nA\n")
+    assert [line.split("\t", 1)[1] for line in db.bind.copied] == ["B\t\t\t\\N\tt"]
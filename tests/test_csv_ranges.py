@@ -0,0 +1,78 @@
+import csv
+import io
+import random
+
+import pytest
+
+from app.importer import find_record_boundaries, plan_csv_ranges
+
+
+def split(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)] or [b""]
+
+
+def make_csv(rows: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    out = io.StringIO(newline="")
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["sku", "name", "description", "price"])
+    for i in range(rows):
+        description = rng.choice(["plain", "has, comma", 'has "quotes"', "multi\nline", "\n", "ünï\ncode"])
+        writer.writerow([f"SKU-{i}", f"name {i}", description, f"{i}.99"])
+    return out.getvalue().encode("utf-8")
+
+
+def test_boundaries_skip_quoted_newlines():
+    data = b'a,b\n1,"x\ny"\n2,z\n'
+    # target 5 is inside the quoted field; the first record end after it is byte 12
+    assert find_record_boundaries([data], [0, 5, 13]) == [4, 12, 16]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 64])
+def test_boundaries_do_not_depend_on_chunk_edges(chunk_size):
+    data = make_csv(40, seed=1)
+    targets = list(range(0, len(data), 7))
+    assert find_record_boundaries(split(data, chunk_size), targets) == find_record_boundaries([data], targets)
+
+
+def test_boundaries_past_the_last_newline_are_not_found():
+    assert find_record_boundaries([b"a\nb"], [0, 2]) == [2]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 4096])
+@pytest.mark.parametrize("parts", [1, 3, 8])
+def test_ranges_reassemble_to_the_whole_file(seed, chunk_size, parts):
+    data = make_csv(60, seed)
+    fieldnames, ranges = plan_csv_ranges(split(data, chunk_size), len(data), parts)
+
+    assert fieldnames == ["sku", "name", "description", "price"]
+    assert 1 <= len(ranges) <= parts
+    assert ranges[0][0] == data.index(b"\n") + 1
+    assert ranges[-1][1] == len(data)
+    assert all(a < b for a, b in ranges)
+    assert all(b == c for (_, b), (c, _) in zip(ranges, ranges[1:]))
+
+    whole = list(csv.DictReader(io.StringIO(data.decode("utf-8"), newline="")))
+    pieces = []
+    for start, end in ranges:
+        text = io.StringIO(data[start:end].decode("utf-8"), newline="")
+        pieces.extend(csv.DictReader(text, fieldnames=fieldnames))
+    assert pieces == whole
+
+
+def test_header_longer_than_the_first_chunk():
+    data = b'sku,"long ""quoted""\nheader",price\nA,x,1\nB,y,2\n'
+    fieldnames, ranges = plan_csv_ranges(split(data, 4), len(data), 2)
+    assert fieldnames == ["sku", 'long "quoted"\nheader', "price"]
+    assert ranges[0][0] == data.index(b"A,")
+
+
+def test_header_only_file_has_no_ranges():
+    data = b"sku,name\n"
+    assert plan_csv_ranges([data], len(data), 4) == (["sku", "name"], [])
+
+
+def test_cr_only_line_endings_are_left_to_the_serial_import():
+    data = b"sku,name\rA,1\rB,2\r"
+    assert plan_csv_ranges(split(data, 5), len(data), 2) == (None, None)
@@ -0,0 +1,79 @@
+import io
+import zlib
+
+import pytest
+
+from app.dedup import SkuIndex
+from app.importer import build_sku_index
+
+
+def test_last_occurrence_wins():
+    index = SkuIndex()
+    index.record("a", 1)
+    index.record("b", 2)
+    index.record("a", 3)
+    assert index.last("a") == 3
+    assert index.last("b") == 2
+    assert index.last("c") is None
+    assert len(index) == 2
+
+
+def test_grows_past_its_initial_capacity():
+    index = SkuIndex(capacity=4)
+    for i in range(10_000):
+        index.record(f"sku-{i}", i + 1)
+    for i in range(0, 10_000, 2):
+        index.record(f"sku-{i}", 20_000 + i)
+    assert len(index) == 10_000
+    assert all(index.last(f"sku-{i}") == (20_000 + i if i % 2 == 0 else i + 1) for i in range(10_000))
+    assert index.nbytes >= 16 * 10_000 / SkuIndex.MAX_LOAD
+
+
+def test_linear_probing_across_the_table_end(monkeypatch):
+    # every key lands in the last slot of an 8-slot table, so probes wrap around
+    monkeypatch.setattr(SkuIndex, "_hash", staticmethod(
+        lambda sku: (7 + 8 * (int(sku) + 1), zlib.crc32(sku.encode()))))
+    index = SkuIndex(capacity=8)
+    for i in range(5):
+        index.record(str(i), i + 1)
+    assert [index.last(str(i)) for i in range(5)] == [1, 2, 3, 4, 5]
+    assert index.last("5") is None
+
+
+def test_full_hash_collisions_are_kept_apart_in_overflow(monkeypatch):
+    monkeypatch.setattr(SkuIndex, "_hash", staticmethod(lambda sku: (42, zlib.crc32(sku.encode()))))
+    index = SkuIndex(capacity=8)
+    for ordinal, sku in enumerate(["x", "y", "z", "y", "x"], start=1):
+        index.record(sku, ordinal)
+    assert (index.last("x"), index.last("y"), index.last("z")) == (5, 4, 3)
+    assert index.last("w") is None
+    assert len(index) == 3
+    # the first sku on a hash owns the slot, the others are kept exactly
+    assert set(index._overflow) == {"y", "z"}
+
+
+def test_zero_hash_does_not_mark_an_empty_slot(monkeypatch):
+    monkeypatch.setattr("app.dedup.hash", lambda sku: 0, raising=False)
+    index = SkuIndex()
+    index.record("zero", 9)
+    index.record("other", 10)
+    assert (index.last("zero"), index.last("other")) == (9, 10)
+    assert len(index) == 2
+
+
+@pytest.mark.parametrize("text, expected", [
+    # ordinals count data rows the way DictReader does: blank lines are skipped,
+    # short and sku-less rows still count
+    ("sku,name\nA,1\n\nb,2\na,3\n", {"a": 3, "b": 2}),
+    ("name,sku\nx\n,\nn, B \n", {"b": 3}),
+    ("sku,name,sku\nfirst,x,Last\n", {"last": 1}),
+    ('sku,description\nA,"multi\nline"\nA,x\n', {"a": 2}),
+])
+def test_build_sku_index(text, expected):
+    index = build_sku_index(io.StringIO(text, newline=""))
+    assert len(index) == len(expected)
+    assert {sku: index.last(sku) for sku in expected} == expected
+
+
+def test_build_sku_index_without_a_sku_column():
+    assert len(build_sku_index(io.StringIO("name\nx\n"))) == 0
@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import pytest
+
+from app.json_stream import JsonItemParser, iter_json_items
+
+
+def parse(text: str, piece: int, **kwargs):
+    parser = JsonItemParser(**kwargs)
+    items = []
+    for i in range(0, len(text), piece):
+        items += parser.feed(text[i:i + piece])
+    return items + parser.feed("", final=True)
+
+
+ITEMS = [{"sku": "a", "price": 1.5}, {"sku": "b", "tags": ["x", "]", ","]}, 12, "s\"}", None, [], {}]
+
+
+@pytest.mark.parametrize("piece", [1, 2, 3, 7, 1000])
+def test_array_items_split_at_any_point(piece):
+    text = " [\n" + ",\n ".join(json.dumps(item) for item in ITEMS) + "\n] \n"
+    assert parse(text, piece) == [(item, None) for item in ITEMS]
+
+
+@pytest.mark.parametrize("piece", [1, 4, 1000])
+def test_ndjson_lines_split_at_any_point(piece):
+    text = "\n".join(json.dumps(item) for item in ITEMS[:2]) + "\n\n" + json.dumps(ITEMS[2])
+    assert parse(text, piece) == [(item, None) for item in ITEMS[:3]]
+
+
+def test_trailing_number_is_not_cut_short():
+    parser = JsonItemParser()
+    assert parser.feed("[1") == []
+    assert parser.feed("23") == []
+    assert parser.feed("]", final=True) == [(123, None)]
+
+
+def test_malformed_ndjson_line_only_fails_that_line():
+    items = parse('{"sku": "a"}\n{"sku": \n{"sku": "c"}\n', 5)
+    assert items[0] == ({"sku": "a"}, None)
+    assert items[1][0] is None and items[1][1].startswith("Invalid JSON")
+    assert items[2] == ({"sku": "c"}, None)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("[1, 2", "Unterminated"),
+    ("[1 2]", "Expected ','"),
+    ("[1,]", "Trailing ','"),
+    ("[1] x", "Unexpected data"),
+    ("[1, {bad}]", "Expecting property name"),
+])
+def test_malformed_array_raises(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse(text, 2)
+
+
+def test_buffered_incomplete_item_is_bounded():
+    parser = JsonItemParser(max_item_chars=100)
+    parser.feed('[{"sku": "a"}, {"sku": "' + "x" * 50)
+    with pytest.raises(ValueError, match="not complete after 100 characters"):
+        parser.feed("x" * 60)
+
+
+def test_ndjson_line_is_bounded():
+    parser = JsonItemParser(max_item_chars=10)
+    assert parser.feed('{"a": 1}\n') == [({"a": 1}, None)]
+    with pytest.raises(ValueError):
+        parser.feed('{"sku": "' + "x" * 20)
+
+
+def test_empty_body_has_no_items():
+    assert parse("  \n ", 1) == []
+
+
+def test_iter_json_items_decodes_utf8_split_inside_a_character():
+    body = json.dumps([{"name": "ünïcødé"}], ensure_ascii=False).encode("utf-8")
+
+    async def chunks():
+        for i in range(len(body)):
+            yield body[i:i + 1]
+
+    async def collect():
+        return [item async for item in iter_json_items(chunks())]
+
+    assert asyncio.run(collect()) == [({"name": "ünïcødé"}, None)]
@@ -0,0 +1,64 @@
+import csv
+import io
+import random
+
+import pytest
+
+from app import importer
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._data.readinto(b)
+
+
+def make_csv(rows: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    ends = [b"\n", b"\r\n", b"\r"]
+    lines = [b"sku,description"] + [b'S%d,"quoted\r\nnewline %d"' % (i, i) if rng.random() < 0.2
+                                     else b"S%d,plain %d" % (i, i) for i in range(rows)]
+    return b"".join(line + rng.choice(ends) for line in lines)
+
+
+def read_rows(stream, resume_offset=0):
+    position = {"offset": 0}
+    reader = csv.DictReader(importer.iter_lines_with_offsets(stream, position, resume_offset))
+    return [(row["sku"], position["offset"]) for row in reader]
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("buffer_size", [1, 2, 5, 64, 1 << 20])
+def test_lines_match_universal_newline_text(monkeypatch, seed, buffer_size):
+    monkeypatch.setattr(importer, "READ_BUFFER_SIZE", buffer_size)
+    data = make_csv(30, seed)
+    position = {"offset": 0}
+    lines = list(importer.iter_lines_with_offsets(io.BytesIO(data), position))
+    assert lines == list(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", newline=""))
+    assert position["offset"] == len(data)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_offsets_are_record_ends(seed):
+    data = make_csv(30, seed)
+    rows = read_rows(io.BytesIO(data))
+    skus = [sku for sku, _ in rows]
+    assert skus == [row["sku"] for row in csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""))]
+    for i, (_, offset) in enumerate(rows):
+        rest = csv.reader(io.StringIO(data[offset:].decode("utf-8"), newline=""))
+        assert [row[0] for row in rest] == skus[i + 1:]
+
+
+@pytest.mark.parametrize("buffer_size", [1, 3, 64, 1 << 20])
+@pytest.mark.parametrize("make_stream", [io.BytesIO, lambda data: io.BufferedReader(Unseekable(data))])
+def test_resume_skips_to_the_checkpoint(monkeypatch, buffer_size, make_stream):
+    monkeypatch.setattr(importer, "READ_BUFFER_SIZE", buffer_size)
+    data = make_csv(20, seed=3)
+    rows = read_rows(io.BytesIO(data))
+    for i, (_, offset) in enumerate(rows):
+        assert read_rows(make_stream(data), resume_offset=offset) == rows[i + 1:]
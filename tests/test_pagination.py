@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import crud
+
+
+@pytest.mark.parametrize("last_id", [1, 42, 2 ** 31 - 1, 10 ** 15])
+def test_cursor_round_trip(last_id):
+    token = crud.encode_cursor(last_id)
+    assert "=" not in token
+    assert crud.decode_cursor(token) == last_id
+
+
+@pytest.mark.parametrize("token", ["", "!!!", "bm90IGpzb24", crud.encode_cursor(1)[:-2], "eyJ4IjoxfQ", "WzFd"])
+def test_bad_cursor_raises_value_error(token):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        crud.decode_cursor(token)
+
+
+def rows(*ids):
+    return [SimpleNamespace(id=i) for i in ids]
+
+
+def test_split_page_with_look_ahead_row():
+    items, next_cursor = crud.split_page(rows(9, 8, 7), 2)
+    assert [r.id for r in items] == [9, 8]
+    assert crud.decode_cursor(next_cursor) == 8
+
+
+def test_split_page_on_the_last_page():
+    assert crud.split_page(rows(3, 2), 2) == (rows(3, 2), None)
+    assert crud.split_page([], 2) == ([], None)
+
+
+def test_keyset_page_statement():
+    stmt = crud.product_page_stmt(limit=5, after=crud.encode_cursor(100), offset=50)
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    assert "products.id < 100" in sql
+    assert "OFFSET" not in sql
+    assert "LIMIT 6" in sql
+